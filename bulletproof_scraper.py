@@ -11,6 +11,8 @@ import sqlite3
 import sys
 from datetime import datetime
 from playwright.sync_api import sync_playwright
+from db_migrations import migrate
+from scan_generations import begin_sweep, finish_sweep
 
 class BulletproofCustomerScraper:
     def __init__(self):
@@ -25,42 +27,9 @@ class BulletproofCustomerScraper:
         print(f"🗄️ Database: {self.db_path}")
         
     def init_database(self):
-        """Ensure database exists"""
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS customers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                first_name TEXT,
-                last_name TEXT,
-                mobile TEXT,
-                address TEXT,
-                postcode TEXT,
-                page INTEGER,
-                first_seen TEXT,
-                last_updated TEXT,
-                is_active BOOLEAN DEFAULT TRUE,
-                extraction_method TEXT DEFAULT 'bulletproof'
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS extraction_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                page INTEGER,
-                customers_found INTEGER,
-                success BOOLEAN,
-                error_message TEXT
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        """Ensure database exists and is on the current schema"""
+        version = migrate(self.db_path)
+        print(f"🗄️ Database schema v{version}")
         
     def get_current_customer_count(self):
         """Get current customer count"""
@@ -71,22 +40,34 @@ class BulletproofCustomerScraper:
         conn.close()
         return count
         
-    def save_customer(self, customer):
-        """Save customer to database"""
+    def save_customer(self, customer, generation=None):
+        """Save customer to database, stamping it with the sweep generation"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
+            # Upsert rather than REPLACE so the row id (and its orders/history) survives
             cursor.execute('''
-                INSERT OR REPLACE INTO customers (
+                INSERT INTO customers (
                     email, first_name, last_name, mobile, address, postcode,
-                    page, first_seen, last_updated, is_active, extraction_method
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    page, first_seen, last_updated, is_active, extraction_method,
+                    last_seen_generation
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(email) DO UPDATE SET
+                    first_name = excluded.first_name,
+                    last_name = excluded.last_name,
+                    mobile = excluded.mobile,
+                    address = excluded.address,
+                    postcode = excluded.postcode,
+                    page = excluded.page,
+                    last_updated = excluded.last_updated,
+                    is_active = TRUE,
+                    last_seen_generation = COALESCE(excluded.last_seen_generation, customers.last_seen_generation)
             ''', (
                 customer['email'], customer['first_name'], customer['last_name'],
                 customer['mobile'], customer['address'], customer['postcode'],
                 customer['page'], customer['extracted_at'], customer['extracted_at'],
-                True, 'bulletproof'
+                True, 'bulletproof', generation
             ))
             
             conn.commit()
@@ -160,6 +141,21 @@ class BulletproofCustomerScraper:
         print(f"    ❌ All navigation attempts failed for page {page_num}")
         return False
     
+    def get_page_count(self, page):
+        """Number of customer pages, read from the pagination dropdown"""
+        try:
+            page.goto(f"{self.base_url}/admin/Customer", wait_until='networkidle', timeout=self.page_timeout)
+            values = []
+            for option in page.query_selector_all('select:first-of-type option'):
+                value = (option.get_attribute('value') or '').strip()
+                if value.isdigit():
+                    values.append(int(value))
+            if values:
+                return max(values)
+        except Exception as e:
+            print(f"⚠️ Could not read page count: {e}")
+        return 27
+    
     def extract_page_customers(self, page, page_num):
         """Extract all customers from current page with robust error handling"""
         customers = []
@@ -275,9 +271,12 @@ class BulletproofCustomerScraper:
                             print("❌ All login attempts failed")
                             return
                 
-                # Extract ALL pages (1-27) to ensure completeness
-                for page_num in range(1, 28):
-                    print(f"\\n📄 === PAGE {page_num}/27 ===")
+                # Extract ALL pages to ensure completeness
+                total_pages = self.get_page_count(page)
+                generation = begin_sweep(self.db_path, 'bulletproof', total_pages)
+                
+                for page_num in range(1, total_pages + 1):
+                    print(f"\\n📄 === PAGE {page_num}/{total_pages} ===")
                     
                     # Navigate to page with retry logic
                     navigation_success = self.robust_page_navigation(page, page_num)
@@ -293,12 +292,13 @@ class BulletproofCustomerScraper:
                         # Save each customer
                         page_saved = 0
                         for customer in customers:
-                            if self.save_customer(customer):
+                            if self.save_customer(customer, generation):
                                 page_saved += 1
                                 total_extracted += 1
                         
                         print(f"    ✅ Page {page_num}: {page_saved} customers saved")
-                        successful_pages += 1
+                        if page_saved == len(customers):
+                            successful_pages += 1
                         self.log_extraction(page_num, page_saved, True)
                         
                     else:
@@ -312,13 +312,20 @@ class BulletproofCustomerScraper:
                     # Respectful delay
                     time.sleep(2)
                 
+                # Deactivate customers the panel no longer lists (complete sweeps only)
+                sweep = finish_sweep(self.db_path, generation, successful_pages)
+                if sweep['status'] == 'swept':
+                    print(f"🧹 Sweep {generation}: {sweep['deactivated']} customers deactivated")
+                else:
+                    print(f"ℹ️ Sweep {generation} {sweep['status']} - nothing deactivated")
+                
                 # Final results
                 final_count = self.get_current_customer_count()
                 
                 print(f"\\n🎉 === BULLETPROOF EXTRACTION COMPLETE ===")
                 print(f"🏆 Total customers: {final_count}")
                 print(f"📈 Added this session: {final_count - initial_count}")
-                print(f"📄 Successful pages: {successful_pages}/27")
+                print(f"📄 Successful pages: {successful_pages}/{total_pages}")
                 print(f"📊 Completion: {final_count/538*100:.1f}%")
                 
                 if final_count >= 500:
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Change feed reader for the customers database
+Triggers append one row per insert/update/delete to the `changes` table;
+each consumer reads from its own committed offset instead of re-querying
+whole tables, and old entries are pruned by retention.
+"""
+
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from db_migrations import DEFAULT_DB_PATH, connect, migrate
+
+CHANGE_BATCH_SIZE = 1000
+
+# Changes older than this are dropped even if a consumer has not read them
+CHANGE_RETENTION_DAYS = 30
+
+# Read by the dashboard's event stream, which keeps no offset here (clients
+# resume from Last-Event-ID): only retention may prune these
+EVENT_TABLES = ('new_customers_today', 'monitoring_log')
+
+
+def read_changes(conn: sqlite3.Connection, after_seq: int, limit: int = CHANGE_BATCH_SIZE,
+                 tables: Optional[Sequence[str]] = None) -> List[Dict]:
+    """Changes with seq > after_seq in commit order (primary key range scan)"""
+    sql = '''
+        SELECT seq, table_name, op, row_id, row_key, changed_columns, changed_at
+        FROM changes WHERE seq > ?
+    '''
+    params = [after_seq]
+    if tables:
+        sql += f" AND table_name IN ({','.join('?' for _ in tables)})"
+        params.extend(tables)
+    sql += " ORDER BY seq LIMIT ?"
+    params.append(limit)
+
+    return [
+        {
+            'seq': row[0],
+            'table': row[1],
+            'op': row[2],
+            'row_id': row[3],
+            'key': row[4],
+            'columns': row[5].split(',') if row[5] else [],
+            'changed_at': row[6],
+        }
+        for row in conn.execute(sql, params).fetchall()
+    ]
+
+
+def get_offset(conn: sqlite3.Connection, consumer: str) -> int:
+    """Last sequence number a consumer has committed (0 if never run)"""
+    row = conn.execute(
+        "SELECT last_seq FROM change_consumers WHERE consumer = ?", (consumer,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def commit_offset(conn: sqlite3.Connection, consumer: str, seq: int,
+                  tables: Optional[Sequence[str]] = None):
+    """Record that a consumer has processed everything up to seq
+
+    `tables` is what the consumer reads (None = every table); compaction
+    only drops a table's changes once all of its readers are past them.
+    """
+    conn.execute('''
+        INSERT INTO change_consumers (consumer, last_seq, updated_at, tables) VALUES (?, ?, ?, ?)
+        ON CONFLICT(consumer) DO UPDATE SET
+            last_seq = MAX(change_consumers.last_seq, excluded.last_seq),
+            updated_at = excluded.updated_at,
+            tables = excluded.tables
+    ''', (consumer, seq, datetime.now().isoformat(), ','.join(sorted(tables)) if tables else None))
+    conn.commit()
+
+
+def needs_resync(conn: sqlite3.Connection, consumer: str) -> bool:
+    """True if retention pruned changes this consumer never read"""
+    row = conn.execute("SELECT last_seq, tables FROM change_consumers WHERE consumer = ?", (consumer,)).fetchone()
+    offset, tables = row if row else (0, None)
+    sql = "SELECT COALESCE(MAX(expired_through), 0) FROM change_expiry"
+    params = []
+    if tables:
+        tables = tables.split(',')
+        sql += f" WHERE table_name IN ({','.join('?' for _ in tables)})"
+        params.extend(tables)
+    return conn.execute(sql, params).fetchone()[0] > offset
+
+
+def consume(conn: sqlite3.Connection, consumer: str, batch_size: int = CHANGE_BATCH_SIZE,
+            tables: Optional[Sequence[str]] = None) -> Iterator[List[Dict]]:
+    """Yield unread change batches, committing the offset after each batch
+
+    The offset for a batch is only committed when the caller asks for the
+    next one, so a consumer that crashes mid-batch re-reads it (at least once).
+    """
+    offset = get_offset(conn, consumer)
+    while True:
+        batch = read_changes(conn, offset, batch_size, tables)
+        if not batch:
+            return
+        yield batch
+        offset = batch[-1]['seq']
+        commit_offset(conn, consumer, offset, tables)
+
+
+def changed_row_ids(changes: List[Dict], table: str = 'customers') -> List[int]:
+    """Distinct row ids touched in a batch (inserts and updates only)"""
+    ids = {}
+    for change in changes:
+        if change['table'] == table:
+            if change['op'] == 'DELETE':
+                ids.pop(change['row_id'], None)
+            else:
+                ids[change['row_id']] = True
+    return list(ids)
+
+
+def compact_changes(conn: sqlite3.Connection, retention_days: int = CHANGE_RETENTION_DAYS) -> Dict:
+    """Drop changes every reader of their table has read, plus anything past retention
+
+    A table no consumer reads, and the event stream's rows (EVENT_TABLES),
+    are kept until retention.
+    """
+    consumed = 0
+    consumers = [(last_seq, tables.split(',') if tables else None)
+                 for last_seq, tables in conn.execute("SELECT last_seq, tables FROM change_consumers")]
+    for (table,) in conn.execute("SELECT DISTINCT table_name FROM changes").fetchall():
+        offsets = [last_seq for last_seq, tables in consumers if tables is None or table in tables]
+        if offsets and table not in EVENT_TABLES:
+            consumed += conn.execute(
+                "DELETE FROM changes WHERE table_name = ? AND seq <= ?", (table, min(offsets))
+            ).rowcount
+
+    cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+    conn.execute('''
+        INSERT INTO change_expiry (table_name, expired_through)
+        SELECT table_name, MAX(seq) FROM changes WHERE changed_at < ? GROUP BY table_name
+        ON CONFLICT(table_name) DO UPDATE SET expired_through = MAX(expired_through, excluded.expired_through)
+    ''', (cutoff,))
+    expired = conn.execute("DELETE FROM changes WHERE changed_at < ?", (cutoff,)).rowcount
+    conn.commit()
+    return {'consumed': consumed, 'expired': expired}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and compact the customer change feed")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database path")
+    parser.add_argument("--compact", action="store_true", help="prune consumed and expired changes")
+    parser.add_argument("--retention-days", type=int, default=CHANGE_RETENTION_DAYS)
+    args = parser.parse_args()
+
+    migrate(args.db)
+    conn = connect(args.db)
+    try:
+        if args.compact:
+            result = compact_changes(conn, args.retention_days)
+            print(f"🧹 Removed {result['consumed']} consumed and {result['expired']} expired changes")
+
+        head = conn.execute("SELECT COUNT(*), MIN(seq), MAX(seq) FROM changes").fetchone()
+        print(f"📜 {head[0]} changes retained (seq {head[1]} → {head[2]})")
+        for consumer, last_seq, updated_at, tables in conn.execute(
+                "SELECT consumer, last_seq, updated_at, tables FROM change_consumers ORDER BY consumer"):
+            lag = (head[2] or last_seq) - last_seq
+            print(f"   {consumer} ({tables or 'all tables'}): offset {last_seq}, {lag} behind (updated {updated_at})")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
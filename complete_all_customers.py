@@ -9,16 +9,17 @@ import time
 import os
 from datetime import datetime
 from playwright.sync_api import sync_playwright
+from customer_journal import CustomerJournal, record_email
 
 def extract_all_customers():
     print("🚀 === EXTRACTING ALL 538 CUSTOMERS ===")
     print("🎯 Will NOT stop until complete!")
     
-    # Load existing data
+    # Load existing data (snapshot plus journal tail)
+    journal = CustomerJournal('customer_data/customers_mcp.json')
     try:
-        with open('customer_data/customers_mcp.json', 'r') as f:
-            customers = json.load(f)
-        existing_emails = {c.get('email', '').lower() for c in customers}
+        customers = journal.load()
+        existing_emails = {record_email(c) for c in customers}
         print(f"📚 Starting with {len(customers)} existing customers")
     except:
         customers = []
@@ -198,6 +199,7 @@ def extract_all_customers():
                                 
                                 # Add to database
                                 customers.append(customer)
+                                journal.append([customer])
                                 existing_emails.add(customer['email'].lower())
                                 page_extracted += 1
                                 total_extracted += 1
@@ -213,9 +215,8 @@ def extract_all_customers():
                     
                     print(f"📊 Page {page_num}: {page_extracted} new customers | Database: {len(customers)} total")
                     
-                    # Save progress every page
-                    with open('customer_data/customers_mcp.json', 'w') as f:
-                        json.dump(customers, f, indent=2)
+                    # Progress is journaled per customer; make this page durable
+                    journal.sync()
                     
                     # Progress update
                     progress = len(customers) / 538 * 100
@@ -251,10 +252,9 @@ def extract_all_customers():
             
         except Exception as e:
             print(f"❌ Fatal error: {e}")
-            # Save whatever we have
-            with open('customer_data/customers_mcp.json', 'w') as f:
-                json.dump(customers, f, indent=2)
         finally:
+            # Everything extracted is already journaled; fold it into the snapshot
+            journal.close()
             browser.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Consolidate every historical customer JSON file into one canonical dataset
+Streams all dumps through an external sort + k-way merge keyed on normalized
+email, reconciles field variants and writes the result into SQLite.
+"""
+
+import os
+import sys
+import json
+import glob
+import heapq
+import time
+import tempfile
+import argparse
+from datetime import datetime
+from itertools import groupby
+from typing import Dict, Iterator, List
+
+from db_migrations import DEFAULT_DB_PATH, connect, migrate
+from customer_orders import order_number
+from scan_generations import RUNNING_GENERATION_SQL
+from json_import import (
+    CUSTOMER_FIELDS, IMPORT_BATCH_SIZE, iter_records, normalize_customer, with_journals, write_customer_batch
+)
+
+# Every file name the scrapers have used for customer dumps
+CONSOLIDATE_PATTERNS = [
+    "customers.json",
+    "customers_complete.json",
+    "customers_mcp.json",
+    "keatchen_customers_final_*.json",
+    "COMPLETE_KEATCHEN_DATABASE_*.json",
+    "FINAL_KEATCHEN_CUSTOMERS_*.json",
+    "backup_*.json",
+    "backup_customers_*.json",
+]
+
+# Records held in memory while building one sorted run
+RUN_SIZE = 20000
+# Maximum runs merged at once (bounds open file handles)
+MAX_FAN_IN = 64
+
+# Scalar columns reconciled across record versions
+RECONCILED_FIELDS = [
+    'first_name', 'last_name', 'mobile', 'address', 'postcode', 'page',
+    'verified_email', 'verified_mobile', 'dob', 'city', 'county',
+]
+
+# The stored row is one of the reconciled versions, so the canonical record
+# replaces it outright instead of being merged again newest-wins
+REPLACE_CUSTOMER_SQL = f'''
+    INSERT INTO customers (
+        {", ".join(CUSTOMER_FIELDS)}, is_active, extraction_method, last_seen_generation
+    ) VALUES ({", ".join("?" for _ in CUSTOMER_FIELDS)}, TRUE, 'consolidate', {RUNNING_GENERATION_SQL})
+    ON CONFLICT(email) DO UPDATE SET
+        {", ".join(f"{field} = excluded.{field}" for field in CUSTOMER_FIELDS if field != 'email')}
+'''
+
+
+def find_customer_files(directory: str = "customer_data") -> List[str]:
+    """All historical dumps in a directory, oldest first, with their journals"""
+    paths = set()
+    for pattern in CONSOLIDATE_PATTERNS:
+        paths.update(glob.glob(os.path.join(directory, pattern)))
+    return with_journals(sorted(paths, key=os.path.getmtime))
+
+
+def iter_normalized(path: str) -> Iterator[Dict]:
+    """Normalized records from one file, tagged with a merge key and recency"""
+    file_time = datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+    for record in iter_records(path):
+        customer = normalize_customer(record)
+        if not customer:
+            continue
+        customer['_key'] = customer['email'].lower()
+        customer['_seen'] = customer['last_updated'] or file_time
+        yield customer
+
+
+def _sort_key(customer: Dict):
+    return (customer['_key'], customer['_seen'])
+
+
+def _write_run(records: List[Dict], tmp_dir: str) -> str:
+    records.sort(key=_sort_key)
+    fd, path = tempfile.mkstemp(suffix='.jsonl', dir=tmp_dir)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, separators=(',', ':')) + '\n')
+    return path
+
+
+def _read_run(path: str) -> Iterator[Dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def build_sorted_runs(paths: List[str], tmp_dir: str, run_size: int = RUN_SIZE) -> List[str]:
+    """Split every input into sorted runs of at most run_size records"""
+    runs = []
+    for path in paths:
+        buffer = []
+        try:
+            for customer in iter_normalized(path):
+                buffer.append(customer)
+                if len(buffer) >= run_size:
+                    runs.append(_write_run(buffer, tmp_dir))
+                    buffer = []
+        except (OSError, ValueError) as e:
+            print(f"⚠️ {path}: {e} (keeping records read so far)")
+        if buffer:
+            runs.append(_write_run(buffer, tmp_dir))
+    return runs
+
+
+def merge_runs(runs: List[str], tmp_dir: str, fan_in: int = MAX_FAN_IN) -> Iterator[Dict]:
+    """k-way merge of sorted runs, in multiple passes if there are too many"""
+    while len(runs) > fan_in:
+        merged = []
+        for i in range(0, len(runs), fan_in):
+            group = runs[i:i + fan_in]
+            fd, path = tempfile.mkstemp(suffix='.jsonl', dir=tmp_dir)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                for record in heapq.merge(*(_read_run(run) for run in group), key=_sort_key):
+                    f.write(json.dumps(record, separators=(',', ':')) + '\n')
+            for run in group:
+                os.remove(run)
+            merged.append(path)
+        runs = merged
+
+    return heapq.merge(*(_read_run(run) for run in runs), key=_sort_key)
+
+
+def _richness(customer: Dict) -> int:
+    return sum(1 for field in RECONCILED_FIELDS if customer.get(field) not in (None, ''))
+
+
+def reconcile(versions: List[Dict], rule: str = 'newest') -> Dict:
+    """Reduce every version of one customer to a single canonical record
+
+    newest:  each field takes the most recent non-empty value.
+    richest: the version with the most populated fields wins outright and
+             only its gaps are filled from the other versions, newest first.
+    """
+    newest_first = sorted(versions, key=lambda c: c['_seen'], reverse=True)
+    if rule == 'richest':
+        ordered = sorted(newest_first, key=_richness, reverse=True)
+        ordered = ordered[:1] + [c for c in newest_first if c is not ordered[0]]
+    else:
+        ordered = newest_first
+
+    canonical = {'email': ordered[0]['email']}
+    for field in RECONCILED_FIELDS:
+        canonical[field] = next(
+            (c[field] for c in ordered if c.get(field) not in (None, '')),
+            None if field == 'page' else ''
+        )
+
+    seen_dates = [c['first_seen'] for c in versions if c.get('first_seen')]
+    canonical['first_seen'] = min(seen_dates) if seen_dates else ''
+    canonical['last_updated'] = newest_first[0]['_seen']
+
+    # Union orders by order number; fields from the preferred version win
+    orders = {}
+    for customer in reversed(ordered):
+        for order in customer.get('orders') or []:
+            order_no = order_number(order)
+            if order_no:
+                orders[order_no] = {**orders.get(order_no, {}), **order}
+    canonical['orders'] = list(orders.values())
+
+    canonical['total_orders'] = max([len(orders)] + [c.get('total_orders') or 0 for c in versions])
+    canonical['has_loyalty'] = any(c.get('has_loyalty') for c in versions)
+    canonical['has_coupons'] = any(c.get('has_coupons') for c in versions)
+    return canonical
+
+
+def _stored_versions(conn, keys: List[str]) -> Dict[str, Dict]:
+    """Current database rows for a batch of merge keys, shaped like file versions"""
+    cursor = conn.execute(
+        f"SELECT {', '.join(CUSTOMER_FIELDS)} FROM customers WHERE lower(email) IN ({','.join('?' for _ in keys)})",
+        keys
+    )
+    stored = {}
+    for row in cursor.fetchall():
+        customer = dict(zip(CUSTOMER_FIELDS, row))
+        customer['_key'] = customer['email'].lower()
+        customer['_seen'] = customer['last_updated'] or ''
+        customer['orders'] = []  # stored orders are kept; file orders are upserted alongside
+        stored[customer['_key']] = customer
+    return stored
+
+
+def write_reconciled(conn, groups: List[List[Dict]], rule: str) -> int:
+    """Reconcile each customer's file versions with its stored row and write them
+
+    The stored spelling of an email is kept, so case variants don't duplicate rows.
+    """
+    stored = _stored_versions(conn, [versions[0]['_key'] for versions in groups])
+    batch = []
+    for versions in groups:
+        existing = stored.get(versions[0]['_key'])
+        canonical = reconcile(versions + [existing] if existing else versions, rule)
+        if existing:
+            canonical['email'] = existing['email']
+        batch.append(canonical)
+    return write_customer_batch(conn, batch, REPLACE_CUSTOMER_SQL)
+
+
+def consolidate(db_path: str, paths: List[str], rule: str = 'newest',
+                tmp_dir: str = None, batch_size: int = IMPORT_BATCH_SIZE) -> Dict:
+    """Merge all files into the customers/orders tables"""
+    migrate(db_path)
+    start_time = time.time()
+    stats = {'files': len(paths), 'versions': 0, 'customers': 0, 'orders': 0}
+
+    with tempfile.TemporaryDirectory(prefix='consolidate_', dir=tmp_dir) as work_dir:
+        runs = build_sorted_runs(paths, work_dir)
+        print(f"🧮 {len(paths)} files split into {len(runs)} sorted runs")
+
+        conn = connect(db_path)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        try:
+            groups = []
+            for _, group in groupby(merge_runs(runs, work_dir), key=lambda c: c['_key']):
+                versions = list(group)
+                stats['versions'] += len(versions)
+                groups.append(versions)
+                if len(groups) >= batch_size:
+                    stats['orders'] += write_reconciled(conn, groups, rule)
+                    stats['customers'] += len(groups)
+                    groups = []
+            if groups:
+                stats['orders'] += write_reconciled(conn, groups, rule)
+                stats['customers'] += len(groups)
+        finally:
+            conn.close()
+
+    stats['seconds'] = time.time() - start_time
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge all historical customer JSON files into SQLite")
+    parser.add_argument("files", nargs="*", help="files to merge (default: every dump in --dir)")
+    parser.add_argument("--dir", default="customer_data", help="directory holding the JSON dumps")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database path")
+    parser.add_argument("--rule", choices=["newest", "richest"], default="newest",
+                        help="how conflicting field values are reconciled")
+    parser.add_argument("--tmp-dir", default=None, help="where sorted runs are spilled")
+    args = parser.parse_args()
+
+    paths = with_journals(args.files) if args.files else find_customer_files(args.dir)
+    if not paths:
+        print("ℹ️ No customer JSON files found")
+        sys.exit(0)
+
+    stats = consolidate(args.db, paths, args.rule, args.tmp_dir)
+    print(f"✅ Consolidated {stats['versions']} records from {stats['files']} files into "
+          f"{stats['customers']} customers and {stats['orders']} orders in {stats['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Customer history lookups
+Triggers record each overwritten customer field in `customer_history`
+(old value + validity range); this module replays those diffs to show a
+customer's change log or reconstruct their record as of any point in time.
+"""
+
+import sys
+import sqlite3
+import argparse
+from typing import Dict, List, Optional, Union
+
+from db_migrations import DEFAULT_DB_PATH, HISTORY_FIELDS, connect
+
+
+def _customer_row(conn: sqlite3.Connection, customer: Union[int, str]) -> Optional[sqlite3.Row]:
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    if isinstance(customer, int):
+        return cursor.execute("SELECT * FROM customers WHERE id = ?", (customer,)).fetchone()
+    row = cursor.execute("SELECT * FROM customers WHERE lower(email) = lower(?)", (customer,)).fetchone()
+    if row is None:
+        # The email itself may have changed since
+        hit = conn.execute('''
+            SELECT customer_id FROM customer_history
+            WHERE field = 'email' AND lower(old_value) = lower(?)
+            ORDER BY id DESC LIMIT 1
+        ''', (customer,)).fetchone()
+        if hit:
+            row = cursor.execute("SELECT * FROM customers WHERE id = ?", (hit[0],)).fetchone()
+    return row
+
+
+def get_customer_history(conn: sqlite3.Connection, customer: Union[int, str]) -> List[Dict]:
+    """Every recorded field change for a customer (id or email), oldest first"""
+    row = _customer_row(conn, customer)
+    if row is None:
+        return []
+
+    changes = conn.execute('''
+        SELECT field, old_value, valid_from, valid_to
+        FROM customer_history WHERE customer_id = ?
+        ORDER BY id
+    ''', (row['id'],)).fetchall()
+
+    # The new value of each change is the old value of the next one, or the current value
+    history = []
+    next_value = {}
+    for field, old_value, valid_from, valid_to in reversed(changes):
+        history.append({
+            'field': field,
+            'old_value': old_value,
+            'new_value': next_value.get(field, row[field]),
+            'valid_from': valid_from,
+            'changed_at': valid_to,
+        })
+        next_value[field] = old_value
+    history.reverse()
+    return history
+
+
+def customer_as_of(conn: sqlite3.Connection, customer: Union[int, str], timestamp: str) -> Optional[Dict]:
+    """Reconstruct a customer record as it was at timestamp (ISO format)
+
+    Starts from the current row and, for each field, restores the old value
+    of the first change made after timestamp.
+    """
+    row = _customer_row(conn, customer)
+    if row is None:
+        return None
+    if row['first_seen'] and row['first_seen'] > timestamp:
+        return None
+
+    state = dict(row)
+    restored = set()
+    for field, old_value in conn.execute('''
+        SELECT field, old_value FROM customer_history
+        WHERE customer_id = ? AND valid_to > ?
+        ORDER BY id
+    ''', (row['id'], timestamp)):
+        if field not in restored:
+            state[field] = old_value
+            restored.add(field)
+
+    state['as_of'] = timestamp
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show a customer's change history")
+    parser.add_argument("customer", help="customer email or id")
+    parser.add_argument("--as-of", help="reconstruct the record at this ISO timestamp")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database path")
+    args = parser.parse_args()
+
+    customer = int(args.customer) if args.customer.isdigit() else args.customer
+    conn = connect(args.db)
+    try:
+        if args.as_of:
+            state = customer_as_of(conn, customer, args.as_of)
+            if state is None:
+                print(f"❌ {args.customer} did not exist at {args.as_of}")
+                sys.exit(1)
+            print(f"🕒 {args.customer} as of {args.as_of}:")
+            for field in HISTORY_FIELDS:
+                print(f"   {field}: {state[field]}")
+        else:
+            history = get_customer_history(conn, customer)
+            if not history:
+                print(f"ℹ️ No recorded changes for {args.customer}")
+            for change in history:
+                print(f"{change['changed_at']}  {change['field']}: "
+                      f"{change['old_value']!r} → {change['new_value']!r}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Append-only customer journal
+Scrapers append new customers to a JSONL journal instead of rewriting the
+whole JSON file after every page; the journal is periodically compacted
+back into the JSON snapshot with an atomic rename.
+"""
+
+import os
+import json
+import time
+from typing import Dict, Iterable, Iterator, List, Set, Union
+
+from json_import import iter_json_array, iter_jsonl
+
+# fsync after this many appended rows or seconds, whichever comes first
+FSYNC_EVERY_ROWS = 50
+FSYNC_EVERY_SECONDS = 5.0
+
+# Fold the journal into the snapshot once it holds this many rows
+COMPACT_EVERY_ROWS = 5000
+
+# Columns of the on-demand CSV export
+CSV_HEADER = "FirstName,LastName,Email,Mobile,Address,Postcode,DOB,City,County,TotalOrders\n"
+
+
+def record_email(record: Dict) -> str:
+    """A record's email, lower-cased ('' when missing or null)"""
+    return str(record.get('email') or '').strip().lower()
+
+
+def record_key(record: Dict) -> Union[str, tuple]:
+    """Identity used to collapse repeated records: the email, or for a
+    record without one its whole content, so distinct email-less rows are
+    all kept and only exact repeats (a crash before truncation) collapse"""
+    return record_email(record) or ('', json.dumps(record, sort_keys=True))
+
+
+class CustomerJournal:
+    def __init__(self, snapshot_path: str, fsync_every: int = FSYNC_EVERY_ROWS,
+                 fsync_interval: float = FSYNC_EVERY_SECONDS,
+                 compact_every: int = COMPACT_EVERY_ROWS):
+        self.snapshot_path = snapshot_path
+        self.journal_path = os.path.splitext(snapshot_path)[0] + '.jsonl'
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.time()
+        self.journal_rows = 0
+
+        directory = os.path.dirname(snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def iter_records(self) -> Iterator[Dict]:
+        """Yield snapshot records followed by the journal tail"""
+        if os.path.exists(self.snapshot_path):
+            yield from iter_json_array(self.snapshot_path)
+        if os.path.exists(self.journal_path):
+            yield from iter_jsonl(self.journal_path)
+
+    def load(self) -> List[Dict]:
+        """Load snapshot plus journal, keeping the latest record per email"""
+        customers = {}
+        self.journal_rows = 0
+        for record in self.iter_records():
+            if not isinstance(record, dict):
+                continue
+            key = record_key(record)
+            customers.pop(key, None)
+            customers[key] = record
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'rb') as f:
+                self.journal_rows = sum(1 for _ in f)
+        return list(customers.values())
+
+    def load_emails(self) -> Set[str]:
+        """Stream the known emails without materializing the records"""
+        emails = {record_email(record) for record in self.iter_records() if isinstance(record, dict)}
+        emails.discard('')
+        return emails
+
+    def append(self, customers: Iterable[Dict]):
+        """Append customers to the journal - cost is proportional to the new rows"""
+        if self._file is None:
+            # Terminate a line torn by an earlier crash so it cannot swallow
+            # ours (checked on bytes: the tear may split a UTF-8 character)
+            torn = False
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, 'rb') as raw:
+                    if raw.seek(0, os.SEEK_END) > 0:
+                        raw.seek(-1, os.SEEK_END)
+                        torn = raw.read(1) != b'\n'
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+            if torn:
+                self._file.write('\n')
+
+        written = 0
+        for customer in customers:
+            self._file.write(json.dumps(customer, separators=(',', ':')) + '\n')
+            written += 1
+        self._file.flush()
+
+        self.journal_rows += written
+        self._unsynced += written
+        if (self._unsynced >= self.fsync_every
+                or time.time() - self._last_sync >= self.fsync_interval):
+            self.sync()
+
+        if self.journal_rows >= self.compact_every:
+            self.compact()
+
+    def sync(self):
+        """fsync pending journal appends"""
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.time()
+
+    def compact(self):
+        """Rewrite snapshot + journal as a new snapshot and truncate the journal
+
+        The new snapshot is written to a temp file and renamed over the old
+        one, so readers always see either the old or the new file. A crash
+        between the rename and the truncate only leaves duplicate journal
+        rows, which load() collapses by email.
+        """
+        self.sync()
+        records = self.load()
+
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('[\n')
+            for i, record in enumerate(records):
+                if i:
+                    f.write(',\n')
+                f.write(json.dumps(record, separators=(',', ':')))
+            f.write('\n]\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self._fsync_directory()
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        open(self.journal_path, 'w').close()
+        self.journal_rows = 0
+
+    def export_csv(self, csv_path: str) -> int:
+        """Write a flat CSV of the current customers (on demand, not per save)"""
+        customers = self.load()
+        with open(csv_path, 'w', encoding='utf-8') as f:
+            f.write(CSV_HEADER)
+            for c in customers:
+                contact = c.get('contact_details') or {}
+                f.write(f'"{c.get("first_name","")}","{c.get("last_name","")}","{c.get("email","")}","{c.get("mobile","")}","{c.get("address","")}","{c.get("postcode","")}","{contact.get("dob","")}","{contact.get("city","")}","{contact.get("county","")}",{len(c.get("orders") or [])}\n')
+        return len(customers)
+
+    def close(self, compact: bool = True):
+        """Flush the journal and, by default, fold it into the snapshot"""
+        self.sync()
+        if compact and self.journal_rows:
+            self.compact()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _fsync_directory(self):
+        directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
@@ -10,11 +10,18 @@ import os
 import sqlite3
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Set, Optional
+from typing import Callable, Dict, List, Set, Optional
 from playwright.sync_api import sync_playwright
-import schedule
 from dotenv import load_dotenv
 import pandas as pd
+from db_migrations import migrate
+from customer_orders import save_orders
+from change_feed import changed_row_ids, commit_offset, compact_changes, consume, needs_resync
+from scan_generations import RUNNING_GENERATION_SQL, begin_sweep, finish_sweep, mark_seen
+from scan_leases import checkpoint, close_batch, leases, node_id, open_batch, page_ranges, release_lease
+from scheduler import Job, Scheduler
+from scan_cadence import AdaptiveInterval
+from repair_planner import log_page_result, read_page_count
 
 # Load environment variables
 load_dotenv()
@@ -28,6 +35,34 @@ class KEATchenCustomerMonitor:
         self.data_dir = os.getenv("DATA_DIR", "/app/data")
         self.headless = os.getenv("HEADLESS", "true").lower() == "true"
         
+        # Scan tiers (seconds); a tier past its deadline stops paging early
+        # - hot: the first few grid pages, where sign-ups land, every few minutes
+        # - full: every page plus the deactivation sweep, nightly
+        # - details: re-read the Details modal of customers not refreshed lately
+        self.scan_jitter = float(os.getenv("SCAN_JITTER_SECONDS", "60"))
+        self.hot_scan_pages = int(os.getenv("HOT_SCAN_PAGES", "2"))
+        self.hot_scan_interval = float(os.getenv("HOT_SCAN_INTERVAL_SECONDS", "600"))
+        self.hot_scan_deadline = float(os.getenv("HOT_SCAN_DEADLINE_SECONDS", "480"))
+        # Adaptive hot scans: intervals follow the sign-up rate per hour of
+        # the week, keeping the mean detection latency at the target
+        self.adaptive_scan = os.getenv("ADAPTIVE_SCAN", "true").lower() == "true"
+        self.scan_target_latency = float(os.getenv("SCAN_TARGET_LATENCY_SECONDS", "300"))
+        self.scan_min_interval = float(os.getenv("SCAN_MIN_INTERVAL_SECONDS", "300"))
+        self.scan_max_interval = float(os.getenv("SCAN_MAX_INTERVAL_SECONDS", "3600"))
+        self.scan_rate_weeks = float(os.getenv("SCAN_RATE_WEEKS", "8"))
+        self.full_scan_time = os.getenv("FULL_SCAN_TIME", "03:00")
+        self.full_scan_deadline = float(os.getenv("FULL_SCAN_DEADLINE_SECONDS", "10800"))
+        self.detail_refresh_interval = float(os.getenv("DETAIL_REFRESH_INTERVAL_SECONDS", "604800"))
+        self.detail_refresh_deadline = float(os.getenv("DETAIL_REFRESH_DEADLINE_SECONDS", "3600"))
+        self.detail_refresh_age_days = float(os.getenv("DETAIL_REFRESH_AGE_DAYS", "7"))
+        self.detail_refresh_limit = int(os.getenv("DETAIL_REFRESH_LIMIT", "200"))
+        self.export_time = os.getenv("EXPORT_TIME", "09:00")
+        # Multi-node mode: monitors sharing the database split each tier's
+        # pages through leases (scan_leases.py) instead of all scanning them
+        self.sharding = os.getenv("SCAN_SHARDING", "false").lower() == "true"
+        self.node_id = node_id()
+        self.export_deadline = float(os.getenv("EXPORT_DEADLINE_SECONDS", "1800"))
+        
         # Ensure data directory exists
         os.makedirs(self.data_dir, exist_ok=True)
         os.makedirs("logs", exist_ok=True)
@@ -52,65 +87,10 @@ class KEATchenCustomerMonitor:
         """Initialize SQLite database for tracking customers"""
         self.db_path = os.path.join(self.data_dir, "customers.db")
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Creates missing tables and upgrades older schemas in place
+        version = migrate(self.db_path)
         
-        # Create customers table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS customers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                first_name TEXT,
-                last_name TEXT,
-                mobile TEXT,
-                address TEXT,
-                postcode TEXT,
-                page INTEGER,
-                first_seen TEXT,
-                last_updated TEXT,
-                verified_email TEXT,
-                verified_mobile TEXT,
-                dob TEXT,
-                city TEXT,
-                county TEXT,
-                total_orders INTEGER DEFAULT 0,
-                has_loyalty BOOLEAN DEFAULT FALSE,
-                has_coupons BOOLEAN DEFAULT FALSE,
-                is_active BOOLEAN DEFAULT TRUE
-            )
-        ''')
-        
-        # Create monitoring log table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS monitoring_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                action TEXT,
-                customers_found INTEGER,
-                new_customers INTEGER,
-                updated_customers INTEGER,
-                errors INTEGER,
-                execution_time REAL
-            )
-        ''')
-        
-        # Create new_customers table for notifications
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS new_customers_today (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                mobile TEXT,
-                detected_at TEXT,
-                notified BOOLEAN DEFAULT FALSE
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        
-        self.logger.info("✅ Database initialized")
+        self.logger.info(f"✅ Database initialized (schema v{version})")
     
     def login(self, page) -> bool:
         """Login to KEATchen admin"""
@@ -195,7 +175,10 @@ class KEATchenCustomerMonitor:
                                 orders.append({
                                     'order_no': order_no,
                                     'date': cells[1].inner_text().strip(),
-                                    'total': cells[4].inner_text().strip()
+                                    'status': cells[2].inner_text().strip(),
+                                    'method': cells[3].inner_text().strip(),
+                                    'total': cells[4].inner_text().strip(),
+                                    'discount': cells[5].inner_text().strip() if len(cells) > 5 else ''
                                 })
             except:
                 pass
@@ -218,7 +201,9 @@ class KEATchenCustomerMonitor:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        cursor.execute("SELECT email FROM customers WHERE is_active = TRUE")
+        # Include deactivated rows: a customer reappearing is reactivated by
+        # the sweep, not reported as new
+        cursor.execute("SELECT email FROM customers")
         existing_emails = {row[0].lower() for row in cursor.fetchall()}
         
         conn.close()
@@ -233,13 +218,31 @@ class KEATchenCustomerMonitor:
             contact = customer.get('contact_details', {})
             
             if is_new:
-                # Insert new customer
-                cursor.execute('''
-                    INSERT OR REPLACE INTO customers (
+                # Insert new customer (upsert keeps the row id stable for its orders)
+                cursor.execute(f'''
+                    INSERT INTO customers (
                         email, first_name, last_name, mobile, address, postcode,
                         page, first_seen, last_updated, verified_email, verified_mobile,
-                        dob, city, county, total_orders, has_loyalty, has_coupons
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        dob, city, county, total_orders, has_loyalty, has_coupons,
+                        last_seen_generation
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {RUNNING_GENERATION_SQL})
+                    ON CONFLICT(email) DO UPDATE SET
+                        first_name = excluded.first_name,
+                        last_name = excluded.last_name,
+                        mobile = excluded.mobile,
+                        address = excluded.address,
+                        postcode = excluded.postcode,
+                        page = excluded.page,
+                        last_updated = excluded.last_updated,
+                        verified_email = excluded.verified_email,
+                        verified_mobile = excluded.verified_mobile,
+                        dob = excluded.dob,
+                        city = excluded.city,
+                        county = excluded.county,
+                        total_orders = excluded.total_orders,
+                        has_loyalty = excluded.has_loyalty,
+                        has_coupons = excluded.has_coupons,
+                        is_active = TRUE
                 ''', (
                     customer.get('email', ''),
                     customer.get('first_name', ''),
@@ -260,31 +263,65 @@ class KEATchenCustomerMonitor:
                     customer.get('has_coupons', False)
                 ))
                 
-                # Add to new customers notification list
+                # Store the scraped orders in the normalized orders table
+                cursor.execute("SELECT id FROM customers WHERE email = ?", (customer.get('email', ''),))
+                customer_id = cursor.fetchone()[0]
+                save_orders(cursor, customer_id, customer.get('orders', []))
+                
+                # Add to new customers notification list (once, even when
+                # monitors on several nodes spot the same sign-up)
                 cursor.execute('''
                     INSERT INTO new_customers_today (email, first_name, last_name, mobile, detected_at)
-                    VALUES (?, ?, ?, ?, ?)
+                    SELECT ?, ?, ?, ?, ?
+                    WHERE NOT EXISTS (SELECT 1 FROM new_customers_today WHERE email = ?)
                 ''', (
                     customer.get('email', ''),
                     customer.get('first_name', ''),
                     customer.get('last_name', ''),
                     customer.get('mobile', ''),
-                    datetime.now().isoformat()
+                    datetime.now().isoformat(),
+                    customer.get('email', '')
                 ))
                 
             else:
-                # Update existing customer
+                # Update existing customer (blank grid/modal fields keep the stored value)
                 cursor.execute('''
                     UPDATE customers SET
-                        last_updated = ?, total_orders = ?, has_loyalty = ?, has_coupons = ?
+                        last_updated = ?, page = COALESCE(?, page), total_orders = ?, has_loyalty = ?, has_coupons = ?,
+                        first_name = COALESCE(NULLIF(?, ''), first_name),
+                        last_name = COALESCE(NULLIF(?, ''), last_name),
+                        mobile = COALESCE(NULLIF(?, ''), mobile),
+                        address = COALESCE(NULLIF(?, ''), address),
+                        postcode = COALESCE(NULLIF(?, ''), postcode),
+                        verified_email = COALESCE(NULLIF(?, ''), verified_email),
+                        verified_mobile = COALESCE(NULLIF(?, ''), verified_mobile),
+                        dob = COALESCE(NULLIF(?, ''), dob),
+                        city = COALESCE(NULLIF(?, ''), city),
+                        county = COALESCE(NULLIF(?, ''), county)
                     WHERE email = ?
                 ''', (
                     customer.get('scraped_at', ''),
+                    customer.get('page'),
                     customer.get('total_orders', 0),
                     customer.get('has_loyalty', False),
                     customer.get('has_coupons', False),
+                    customer.get('first_name', ''),
+                    customer.get('last_name', ''),
+                    customer.get('mobile', ''),
+                    customer.get('address', ''),
+                    customer.get('postcode', ''),
+                    contact.get('verified_email', ''),
+                    contact.get('verified_mobile', ''),
+                    contact.get('dob', ''),
+                    contact.get('city', ''),
+                    contact.get('county', ''),
                     customer.get('email', '')
                 ))
+                
+                cursor.execute("SELECT id FROM customers WHERE email = ?", (customer.get('email', ''),))
+                row = cursor.fetchone()
+                if row:
+                    save_orders(cursor, row[0], customer.get('orders', []))
             
             conn.commit()
             
@@ -293,124 +330,258 @@ class KEATchenCustomerMonitor:
         finally:
             conn.close()
     
-    def scan_for_new_customers(self) -> Dict:
-        """Scan all pages for new customers"""
+    def get_page_count(self, page) -> int:
+        """Number of customer pages, read from the pagination dropdown"""
+        return read_page_count(page)
+
+    def goto_grid_page(self, page, page_num: int):
+        """Show one page of the customer grid via the pagination dropdown"""
+        dropdown = page.query_selector('select:first-of-type')
+        if dropdown and dropdown.input_value() != str(page_num):
+            dropdown.select_option(str(page_num))
+            page.wait_for_load_state('networkidle')
+            time.sleep(0.5)
+    
+    def read_grid_row(self, row, page_num: int, total_pages: int) -> Optional[Dict]:
+        """Basic customer fields from a grid row (None for header/pagination rows)"""
+        cells = row.query_selector_all('td')
+        if len(cells) < 6:
+            return None
+        
+        # Skip header/pagination rows
+        row_text = row.inner_text()
+        if 'Firstname' in row_text or f'of {total_pages}' in row_text:
+            return None
+        
+        return {
+            'first_name': cells[0].inner_text().strip(),
+            'last_name': cells[1].inner_text().strip(),
+            'email': cells[2].inner_text().strip(),
+            'mobile': cells[3].inner_text().strip(),
+            'address': cells[4].inner_text().strip(),
+            'postcode': cells[5].inner_text().strip(),
+            'page': page_num,
+            'scraped_at': datetime.now().isoformat()
+        }
+    
+    def open_customer_details(self, page, row, customer: Dict) -> Dict:
+        """Open a row's Details modal, read it and close it again"""
+        details_btn = row.query_selector('button')
+        if not details_btn:
+            return customer
+        
+        details_btn.click()
+        time.sleep(0.8)
+        customer = self.extract_customer_from_modal(page, customer)
+        
+        close_btn = page.query_selector('button:has-text("Close")')
+        if close_btn:
+            close_btn.click()
+            time.sleep(0.3)
+        return customer
+    
+    def open_customer_grid(self, page, phases: Dict[str, float]) -> Optional[int]:
+        """Log in and open the customer grid; returns its page count (None if login failed)"""
+        phase_start = time.time()
+        logged_in = self.login(page)
+        phases['login'] = time.time() - phase_start
+        if not logged_in:
+            return None
+        
+        phase_start = time.time()
+        page.goto(f"{self.base_url}/admin/Customer")
+        page.wait_for_load_state('networkidle')
+        
+        total_pages = self.get_page_count(page)
+        phases['navigate'] = time.time() - phase_start
+        return total_pages
+    
+    def scan_page(self, page, page_num: int, total_pages: int, existing_emails: Set[str], stats: Dict,
+                  phases: Dict[str, float], generation: Optional[int] = None) -> bool:
+        """Scan one grid page for new customers; True if every row on it was read"""
+        self.logger.info(f"🔍 Scanning page {page_num}/{total_pages}")
+        
+        # Navigate to page
+        try:
+            self.goto_grid_page(page, page_num)
+        except Exception as e:
+            self.logger.error(f"Navigation error page {page_num}: {e}")
+            stats['errors'] += 1
+            self.log_page_result(page_num, 0, False, f"Navigation failed: {e}")
+            return False
+        
+        # Extract customers from current page
+        try:
+            customer_rows = page.query_selector_all('tbody tr')
+            page_emails = []
+            page_failed = False
+            
+            for row in customer_rows:
+                try:
+                    customer = self.read_grid_row(row, page_num, total_pages)
+                    if customer is None:
+                        continue
+                    
+                    stats['customers_found'] += 1
+                    page_emails.append(customer['email'])
+                    
+                    # Check if this is a new customer
+                    if customer['email'].lower() not in existing_emails:
+                        self.logger.info(f"🆕 NEW CUSTOMER: {customer['first_name']} {customer['last_name']} ({customer['email']})")
+                        
+                        # Details modal for full extraction
+                        detail_start = time.time()
+                        customer = self.open_customer_details(page, row, customer)
+                        phases['details'] += time.time() - detail_start
+                        
+                        # Save new customer
+                        self.save_customer_to_db(customer, is_new=True)
+                        existing_emails.add(customer['email'].lower())
+                        stats['new_customers'] += 1
+                        
+                    else:
+                        # Existing customer - quick update check
+                        stats['updated_customers'] += 1
+                    
+                except Exception as e:
+                    self.logger.error(f"Customer processing error: {e}")
+                    stats['errors'] += 1
+                    page_failed = True
+                    continue
+            
+            # Stamp everyone on this page with the sweep generation
+            if generation is not None:
+                mark_seen(self.db_path, generation, page_emails, page_num)
+            page_ok = bool(page_emails) and not page_failed
+            self.log_page_result(page_num, len(page_emails), page_ok, "Row errors" if page_failed else None)
+            
+            self.logger.info(f"✅ Page {page_num}: {stats['customers_found']} total, {stats['new_customers']} new")
+            return page_ok
+            
+        except Exception as e:
+            self.logger.error(f"Page {page_num} scanning error: {e}")
+            stats['errors'] += 1
+            self.log_page_result(page_num, 0, False, str(e))
+            return False
+    
+    def shard_settings(self, kind: str) -> Dict[str, float]:
+        """Batch join window and maximum age (seconds) for a tier's shared work"""
+        if kind == "hot_scan":
+            interval = self.scan_min_interval if self.adaptive_scan else self.hot_scan_interval
+            return {'join_window': interval / 2, 'max_age': self.hot_scan_deadline}
+        if kind == "full_scan":
+            return {'join_window': 12 * 3600, 'max_age': self.full_scan_deadline}
+        return {'join_window': self.detail_refresh_interval / 2, 'max_age': self.detail_refresh_deadline}
+    
+    def open_shared_batch(self, kind: str, ranges: List, sweep_pages: Optional[int] = None) -> Dict:
+        """Join or start the tier's batch of page-range leases"""
+        batch = open_batch(self.db_path, kind, ranges, sweep_pages=sweep_pages, **self.shard_settings(kind))
+        if batch['joined']:
+            self.logger.info(f"🤝 Joining {kind} batch {batch['id']} ({batch['status']})")
+        return batch
+    
+    def work_shared_batch(self, batch: Dict, scan: Callable[[int], bool], deadline: Optional[float] = None,
+                          wait: bool = False) -> Optional[Dict]:
+        """Run scan(page_num) over every page this node manages to lease from a batch
+
+        Returns the batch's page totals if this node closed it, else None.
+        """
+        for lease in leases(self.db_path, batch['id'], self.node_id, deadline, wait):
+            self.logger.info(f"🔒 Leased pages {lease['next_page']}-{lease['last_page']} (fence {lease['fence']})")
+            while True:
+                if deadline is not None and time.monotonic() > deadline:
+                    self.logger.warning(f"⏱️ Deadline reached - handing back pages {lease['next_page']}-{lease['last_page']}")
+                    release_lease(self.db_path, lease)
+                    break
+                result = checkpoint(self.db_path, lease, scan(lease['next_page']))
+                if result == 'lost':
+                    self.logger.warning(f"⚠️ Lease on pages {lease['first_page']}-{lease['last_page']} was reclaimed - stopping")
+                    break
+                if result == 'done':
+                    break
+        
+        totals = close_batch(self.db_path, batch['id'])
+        if totals:
+            self.logger.info(f"📦 Closed batch {batch['id']}: {totals['pages_ok']}/{totals['pages']} pages ok")
+        return totals
+    
+    def scan_for_new_customers(self, deadline: Optional[float] = None, tier: str = "full") -> Dict:
+        """Scan for new customers: every page ("full") or the first HOT_SCAN_PAGES ("hot")
+
+        Only a full scan stamps sweep generations and may deactivate
+        customers. Paging stops at a time.monotonic() deadline. With
+        SCAN_SHARDING the pages are shared with other nodes through leases.
+        """
         start_time = time.time()
         stats = {
             'customers_found': 0,
             'new_customers': 0,
             'updated_customers': 0,
-            'errors': 0
+            'errors': 0,
+            'deactivated': 0
         }
+        # Seconds spent per phase (details = new-customer modals, not in pages)
+        phases = {}
         
         existing_emails = self.get_existing_customers()
-        self.logger.info(f"📚 Starting scan. {len(existing_emails)} existing customers in database")
+        self.logger.info(f"📚 Starting {tier} scan. {len(existing_emails)} existing customers in database")
         
         with sync_playwright() as p:
             browser = p.chromium.launch(headless=self.headless)
             page = browser.new_page()
             
             try:
-                # Login
-                if not self.login(page):
+                total_pages = self.open_customer_grid(page, phases)
+                if total_pages is None:
                     stats['errors'] += 1
                     return stats
                 
-                # Navigate to customers
-                page.goto(f"{self.base_url}/admin/Customer")
-                page.wait_for_load_state('networkidle')
+                full = tier == "full"
+                last_page = total_pages if full else min(self.hot_scan_pages, total_pages)
+                phases['details'] = 0.0
+                pages_start = time.time()
                 
-                # Scan all 27 pages
-                for page_num in range(1, 28):
-                    self.logger.info(f"🔍 Scanning page {page_num}/27")
-                    
-                    # Navigate to page
-                    if page_num > 1:
-                        try:
-                            dropdown = page.query_selector('select:first-of-type')
-                            if dropdown:
-                                dropdown.select_option(str(page_num))
-                                page.wait_for_load_state('networkidle')
-                                time.sleep(0.5)
-                        except Exception as e:
-                            self.logger.error(f"Navigation error page {page_num}: {e}")
-                            stats['errors'] += 1
-                            continue
-                    
-                    # Extract customers from current page
-                    try:
-                        customer_rows = page.query_selector_all('tbody tr')
-                        
-                        for row in customer_rows:
-                            try:
-                                cells = row.query_selector_all('td')
-                                if len(cells) < 6:
-                                    continue
-                                
-                                # Skip header/pagination rows
-                                row_text = row.inner_text()
-                                if 'Firstname' in row_text or 'of 27' in row_text:
-                                    continue
-                                
-                                # Basic customer data
-                                customer = {
-                                    'first_name': cells[0].inner_text().strip(),
-                                    'last_name': cells[1].inner_text().strip(),
-                                    'email': cells[2].inner_text().strip(),
-                                    'mobile': cells[3].inner_text().strip(),
-                                    'address': cells[4].inner_text().strip(),
-                                    'postcode': cells[5].inner_text().strip(),
-                                    'page': page_num,
-                                    'scraped_at': datetime.now().isoformat()
-                                }
-                                
-                                stats['customers_found'] += 1
-                                
-                                # Check if this is a new customer
-                                if customer['email'].lower() not in existing_emails:
-                                    self.logger.info(f"🆕 NEW CUSTOMER: {customer['first_name']} {customer['last_name']} ({customer['email']})")
-                                    
-                                    # Click Details for full extraction
-                                    details_btn = row.query_selector('button')
-                                    if details_btn:
-                                        details_btn.click()
-                                        time.sleep(0.8)
-                                        
-                                        # Extract detailed data
-                                        customer = self.extract_customer_from_modal(page, customer)
-                                        
-                                        # Close modal
-                                        close_btn = page.query_selector('button:has-text("Close")')
-                                        if close_btn:
-                                            close_btn.click()
-                                            time.sleep(0.3)
-                                    
-                                    # Save new customer
-                                    self.save_customer_to_db(customer, is_new=True)
-                                    existing_emails.add(customer['email'].lower())
-                                    stats['new_customers'] += 1
-                                    
-                                else:
-                                    # Existing customer - quick update check
-                                    stats['updated_customers'] += 1
-                                
-                            except Exception as e:
-                                self.logger.error(f"Customer processing error: {e}")
-                                stats['errors'] += 1
-                                continue
-                        
-                        self.logger.info(f"✅ Page {page_num}: {stats['customers_found']} total, {stats['new_customers']} new")
-                        
-                    except Exception as e:
-                        self.logger.error(f"Page {page_num} scanning error: {e}")
-                        stats['errors'] += 1
-                        continue
+                if self.sharding:
+                    batch = self.open_shared_batch(f"{tier}_scan", page_ranges(1, last_page),
+                                                   sweep_pages=total_pages if full else None)
+                    generation = batch['generation']
+                    # Only a full sweep waits out other nodes' leases, so a
+                    # crashed node's pages are still scanned before the sweep
+                    totals = self.work_shared_batch(batch, lambda page_num: page_num <= total_pages and self.scan_page(
+                        page, page_num, total_pages, existing_emails, stats, phases, generation), deadline, wait=full)
+                    pages_ok = totals['pages_ok'] if totals else None
+                else:
+                    generation = begin_sweep(self.db_path, 'monitor', total_pages) if full else None
+                    pages_ok = 0
+                    for page_num in range(1, last_page + 1):
+                        # Out of budget: the sweep below sees a partial scan and deactivates nobody
+                        if deadline is not None and time.monotonic() > deadline:
+                            self.logger.warning(f"⏱️ Scan deadline reached - stopping at page {page_num}/{last_page}")
+                            break
+                        pages_ok += self.scan_page(page, page_num, total_pages, existing_emails, stats, phases,
+                                                   generation)
+                
+                phases['pages'] = time.time() - pages_start - phases['details']
+                
+                # Deactivate customers missing from a complete sweep (when
+                # sharing, only the node that closed the batch does this)
+                if generation is not None and pages_ok is not None:
+                    phase_start = time.time()
+                    sweep = finish_sweep(self.db_path, generation, pages_ok)
+                    phases['sweep'] = time.time() - phase_start
+                    stats['deactivated'] = sweep['deactivated']
+                    if sweep['status'] == 'swept':
+                        self.logger.info(f"🧹 Sweep {generation}: {sweep['deactivated']} customers deactivated")
+                    elif sweep['status'] == 'aborted':
+                        self.logger.warning(f"⚠️ Sweep {generation}: {sweep['unseen']} unseen customers is implausibly many - nothing deactivated")
+                    else:
+                        self.logger.info(f"ℹ️ Sweep {generation} partial ({pages_ok}/{sweep['pages_expected']} pages) - nothing deactivated")
                 
                 execution_time = time.time() - start_time
-                self.logger.info(f"🎉 Scan complete in {execution_time:.1f}s")
+                self.logger.info(f"🎉 {tier.capitalize()} scan complete in {execution_time:.1f}s")
                 
                 # Log scan results
-                self.log_scan_results(stats, execution_time)
+                self.log_scan_results(stats, execution_time, phases, action=f"{tier}_scan")
                 
             except Exception as e:
                 self.logger.error(f"❌ Fatal scan error: {e}")
@@ -420,8 +591,113 @@ class KEATchenCustomerMonitor:
         
         return stats
     
-    def log_scan_results(self, stats: Dict, execution_time: float):
-        """Log scan results to database"""
+    def get_stale_customers(self, limit: int) -> Dict[str, int]:
+        """Active customers with the oldest details, past the refresh age (email -> page)"""
+        cutoff = (datetime.now() - timedelta(days=self.detail_refresh_age_days)).isoformat()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute('''
+                SELECT lower(email), page FROM customers
+                WHERE is_active = TRUE AND page IS NOT NULL
+                AND (last_updated IS NULL OR last_updated < ?)
+                ORDER BY last_updated
+                LIMIT ?
+            ''', (cutoff, limit)).fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+    
+    def refresh_page(self, page, page_num: int, total_pages: int, stale: Dict[str, int], stats: Dict) -> bool:
+        """Refresh the stale customers found on one grid page (removing them from stale)"""
+        try:
+            self.goto_grid_page(page, page_num)
+            customer_rows = page.query_selector_all('tbody tr')
+        except Exception as e:
+            self.logger.error(f"Navigation error page {page_num}: {e}")
+            stats['errors'] += 1
+            return False
+        
+        page_ok = True
+        for row in customer_rows:
+            try:
+                customer = self.read_grid_row(row, page_num, total_pages)
+                if customer is None or customer['email'].lower() not in stale:
+                    continue
+                
+                stats['customers_found'] += 1
+                del stale[customer['email'].lower()]
+                customer = self.open_customer_details(page, row, customer)
+                self.save_customer_to_db(customer)
+                stats['updated_customers'] += 1
+            except Exception as e:
+                self.logger.error(f"Customer refresh error: {e}")
+                stats['errors'] += 1
+                page_ok = False
+        return page_ok
+    
+    def refresh_customer_details(self, deadline: Optional[float] = None) -> Dict:
+        """Re-read the Details modal (contact details, orders) of stale customers"""
+        start_time = time.time()
+        stats = {
+            'customers_found': 0,
+            'new_customers': 0,
+            'updated_customers': 0,
+            'errors': 0
+        }
+        phases = {}
+        
+        stale = self.get_stale_customers(self.detail_refresh_limit)
+        if not stale:
+            self.logger.info("✅ No stale customer details to refresh")
+            return stats
+        self.logger.info(f"🔄 Refreshing details of {len(stale)} customers")
+        
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=self.headless)
+            page = browser.new_page()
+            
+            try:
+                total_pages = self.open_customer_grid(page, phases)
+                if total_pages is None:
+                    stats['errors'] += 1
+                    return stats
+                
+                phase_start = time.time()
+                # Visit the pages the customers were last seen on; anyone who
+                # moved is still refreshed if they turn up on a visited page
+                pages = sorted(set(stale.values()))
+                if self.sharding:
+                    batch = self.open_shared_batch("detail_refresh", [(page_num, page_num) for page_num in pages])
+                    self.work_shared_batch(batch, lambda page_num: page_num <= total_pages and self.refresh_page(
+                        page, page_num, total_pages, stale, stats), deadline)
+                else:
+                    for page_num in pages:
+                        if not stale:
+                            break
+                        if deadline is not None and time.monotonic() > deadline:
+                            self.logger.warning(f"⏱️ Detail refresh deadline reached - {len(stale)} customers left")
+                            break
+                        if page_num <= total_pages:
+                            self.refresh_page(page, page_num, total_pages, stale, stats)
+                
+                phases['details'] = time.time() - phase_start
+                execution_time = time.time() - start_time
+                left = "" if self.sharding else f", {len(stale)} not found"
+                self.logger.info(f"🎉 Detail refresh complete in {execution_time:.1f}s: "
+                                 f"{stats['updated_customers']} refreshed{left}")
+                self.log_scan_results(stats, execution_time, phases, action="detail_refresh")
+                
+            except Exception as e:
+                self.logger.error(f"❌ Fatal detail refresh error: {e}")
+                stats['errors'] += 1
+            finally:
+                browser.close()
+        
+        return stats
+    
+    def log_scan_results(self, stats: Dict, execution_time: float, phases: Optional[Dict[str, float]] = None,
+                         action: str = 'full_scan'):
+        """Log scan results (and per-phase timings) to database"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
@@ -432,17 +708,26 @@ class KEATchenCustomerMonitor:
             ) VALUES (?, ?, ?, ?, ?, ?, ?)
         ''', (
             datetime.now().isoformat(),
-            'full_scan',
+            action,
             stats['customers_found'],
             stats['new_customers'],
             stats['updated_customers'],
             stats['errors'],
             execution_time
         ))
+        log_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO scan_phases (log_id, phase, seconds) VALUES (?, ?, ?)",
+            [(log_id, phase, seconds) for phase, seconds in (phases or {}).items()]
+        )
         
         conn.commit()
         conn.close()
     
+    def log_page_result(self, page_num: int, customers_found: int, success: bool, error_msg: Optional[str] = None):
+        """Record a page outcome in extraction_log for the repair planner"""
+        log_page_result(self.db_path, page_num, customers_found, success, error_msg)
+    
     def get_new_customers_today(self) -> List[Dict]:
         """Get list of new customers detected today"""
         conn = sqlite3.connect(self.db_path)
@@ -516,6 +801,51 @@ class KEATchenCustomerMonitor:
         
         return json_file, csv_file, summary_file
     
+    def export_changes(self, consumer: str = "hourly_export") -> Optional[str]:
+        """Export only customers changed since this consumer's last run"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+
+        if needs_resync(conn, consumer):
+            # Retention pruned changes we never read - fall back to a full snapshot
+            self.logger.warning("⚠️ Change feed offset expired - running full export")
+            head = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+            conn.close()
+            self.export_current_database()
+            conn = sqlite3.connect(self.db_path)
+            commit_offset(conn, consumer, head, ['customers'])
+            conn.close()
+            return None
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        export_file = os.path.join(self.data_dir, f"customers_changes_{timestamp}.jsonl")
+        exported = 0
+
+        try:
+            with open(export_file, 'w', encoding='utf-8') as f:
+                for batch in consume(conn, consumer, tables=['customers']):
+                    ids = changed_row_ids(batch)
+                    if not ids:
+                        continue
+                    rows = conn.execute(
+                        f"SELECT * FROM customers WHERE id IN ({','.join('?' for _ in ids)})", ids
+                    ).fetchall()
+                    for row in rows:
+                        f.write(json.dumps(dict(row), default=str) + '\n')
+                    exported += len(rows)
+
+            compact_changes(conn)
+        finally:
+            conn.close()
+
+        if not exported:
+            os.remove(export_file)
+            self.logger.info("📄 No customer changes since last export")
+            return None
+
+        self.logger.info(f"📄 Incremental export: {exported} changed customers → {export_file}")
+        return export_file
+
     def generate_new_customer_report(self) -> str:
         """Generate report of new customers detected"""
         new_customers = self.get_new_customers_today()
@@ -541,21 +871,21 @@ class KEATchenCustomerMonitor:
         
         return report
     
-    def run_monitoring_cycle(self):
-        """Run one complete monitoring cycle"""
-        self.logger.info("🔄 Starting monitoring cycle...")
+    def run_monitoring_cycle(self, deadline: Optional[float] = None, tier: str = "full"):
+        """Run one monitoring cycle for a scan tier ("hot" or "full")"""
+        self.logger.info(f"🔄 Starting {tier} monitoring cycle...")
         
         try:
             # Scan for new customers
-            stats = self.scan_for_new_customers()
+            stats = self.scan_for_new_customers(deadline, tier)
             
             # Generate reports
             if stats['new_customers'] > 0:
                 report = self.generate_new_customer_report()
                 self.logger.info(f"📢 NEW CUSTOMER ALERT:\\n{report}")
             
-            # Export database
-            self.export_current_database()
+            # Export rows changed since the last cycle (full export runs daily)
+            self.export_changes()
             
             self.logger.info(f"✅ Monitoring cycle complete: {stats['new_customers']} new customers")
             
@@ -566,19 +896,35 @@ class KEATchenCustomerMonitor:
         """Start continuous monitoring service"""
         self.logger.info("🚀 Starting KEATchen Customer Monitoring Service")
         
-        # Schedule monitoring runs
-        schedule.every(1).hours.do(self.run_monitoring_cycle)  # Every hour
-        schedule.every().day.at("09:00").do(self.export_current_database)  # Daily export
-        
-        # Run initial scan
-        self.logger.info("🔍 Running initial scan...")
-        self.run_monitoring_cycle()
-        
-        # Start scheduling loop
-        self.logger.info("⏰ Monitoring service active - checking every hour")
-        while True:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
+        # The scan tiers share one browser slot ("browser" group), listed in
+        # priority order; the export runs alongside them. A missed hot scan
+        # just waits for its next slot, a missed nightly sweep or detail
+        # refresh runs once as soon as the browser is free.
+        hot_interval = self.hot_scan_interval
+        if self.adaptive_scan:
+            hot_interval = AdaptiveInterval(self.db_path, self.scan_target_latency, self.scan_min_interval,
+                                            self.scan_max_interval, fallback=self.hot_scan_interval,
+                                            weeks=self.scan_rate_weeks)
+        
+        scheduler = Scheduler(self.db_path)
+        scheduler.add(Job("hot_scan", lambda deadline: self.run_monitoring_cycle(deadline, "hot"),
+                          every=hot_interval, jitter=self.scan_jitter,
+                          deadline=self.hot_scan_deadline, catch_up="skip", group="browser"))
+        scheduler.add(Job("full_scan", lambda deadline: self.run_monitoring_cycle(deadline, "full"),
+                          at=self.full_scan_time, jitter=self.scan_jitter,
+                          deadline=self.full_scan_deadline, catch_up="once", group="browser"))
+        scheduler.add(Job("detail_refresh", self.refresh_customer_details,
+                          every=self.detail_refresh_interval, jitter=self.scan_jitter,
+                          deadline=self.detail_refresh_deadline, catch_up="once", group="browser"))
+        scheduler.add(Job("export", lambda deadline: self.export_current_database(), at=self.export_time,
+                          deadline=self.export_deadline, catch_up="once"))
+        
+        cadence = (f"adaptively ({self.scan_min_interval / 60:.0f}-{self.scan_max_interval / 60:.0f} min, "
+                   f"target latency {self.scan_target_latency / 60:.0f} min)" if self.adaptive_scan
+                   else f"every {self.hot_scan_interval / 60:.0f} min")
+        self.logger.info(f"⏰ Monitoring service active - first {self.hot_scan_pages} pages {cadence}, "
+                         f"full sweep daily at {self.full_scan_time}, export daily at {self.export_time}")
+        scheduler.run_forever()
 
 def main():
     """Main monitoring service entry point"""
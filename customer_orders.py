@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Normalized order storage for the KEATchen customer database
+Parses scraped order rows and writes them to the indexed orders table
+"""
+
+import re
+import sqlite3
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Optional
+
+# Date formats seen in the admin panel's Orders tab
+ORDER_DATE_FORMATS = [
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d',
+]
+
+
+def parse_pence(value) -> Optional[int]:
+    """Convert a scraped money string like '£12.50' into integer pence"""
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    cleaned = re.sub(r'[^0-9.\-]', '', str(value))
+    if not cleaned or cleaned in ('.', '-'):
+        return None
+    try:
+        return int((Decimal(cleaned) * 100).quantize(Decimal('1')))
+    except InvalidOperation:
+        return None
+
+
+def parse_order_date(value) -> str:
+    """Normalize an order date to ISO format so it sorts and indexes correctly"""
+    text = str(value or '').strip()
+    for fmt in ORDER_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).isoformat()
+        except ValueError:
+            continue
+    return text
+
+
+def order_number(order: Dict) -> str:
+    """An order's number under any scraper's key, as text (legacy dumps hold some as JSON numbers)"""
+    return str(order.get('order_no') or order.get('order_number') or order.get('order_id') or '').strip()
+
+
+def normalize_order(order: Dict) -> Optional[Dict]:
+    """Map the key variants used by the different scrapers onto one shape"""
+    order_no = order_number(order)
+    if not order_no or order_no == 'Order No.':
+        return None
+
+    return {
+        'order_no': order_no,
+        'order_date': parse_order_date(order.get('date')),
+        'status': order.get('status', ''),
+        'method': order.get('method', ''),
+        'total_pence': parse_pence(order.get('total')),
+        'discount': order.get('discount', ''),
+    }
+
+
+UPSERT_ORDER_SQL = '''
+    INSERT INTO orders (
+        order_no, customer_id, order_date, status, method, total_pence, discount
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(customer_id, order_no) DO UPDATE SET
+        order_date = COALESCE(NULLIF(excluded.order_date, ''), orders.order_date),
+        status = COALESCE(NULLIF(excluded.status, ''), orders.status),
+        method = COALESCE(NULLIF(excluded.method, ''), orders.method),
+        total_pence = COALESCE(excluded.total_pence, orders.total_pence),
+        discount = COALESCE(NULLIF(excluded.discount, ''), orders.discount)
+'''
+
+
+def order_rows(customer_id: int, orders: Iterable[Dict]) -> List[tuple]:
+    """Build orders table parameter tuples for one customer"""
+    rows = []
+    for order in orders or []:
+        normalized = normalize_order(order)
+        if normalized:
+            rows.append((
+                normalized['order_no'],
+                customer_id,
+                normalized['order_date'],
+                normalized['status'],
+                normalized['method'],
+                normalized['total_pence'],
+                normalized['discount'],
+            ))
+    return rows
+
+
+def save_orders(cursor, customer_id: int, orders: Iterable[Dict]) -> int:
+    """Upsert a customer's orders with a single batched executemany"""
+    rows = order_rows(customer_id, orders)
+    if rows:
+        cursor.executemany(UPSERT_ORDER_SQL, rows)
+    return len(rows)
+
+
+def get_order_history(conn: sqlite3.Connection, email: str) -> List[Dict]:
+    """Return a customer's orders, newest first (uses idx_orders_customer)"""
+    cursor = conn.execute('''
+        SELECT o.order_no, o.order_date, o.status, o.method, o.total_pence, o.discount
+        FROM orders o
+        JOIN customers c ON c.id = o.customer_id
+        WHERE c.email = ?
+        ORDER BY o.order_date DESC
+    ''', (email,))
+
+    return [
+        {
+            'order_no': row[0],
+            'date': row[1],
+            'status': row[2],
+            'method': row[3],
+            'total_pence': row[4],
+            'discount': row[5],
+        }
+        for row in cursor.fetchall()
+    ]
+
+
+def get_revenue(conn: sqlite3.Connection, start: str, end: str) -> Dict:
+    """Order count and revenue in pence for a date range (uses idx_orders_date)"""
+    cursor = conn.execute('''
+        SELECT COUNT(*), COALESCE(SUM(total_pence), 0)
+        FROM orders
+        WHERE order_date >= ? AND order_date < ?
+    ''', (start, end))
+    count, revenue = cursor.fetchone()
+    return {'orders': count, 'revenue_pence': revenue}
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Full-text customer search
+Queries the customers_fts index (FTS5, kept in sync by triggers) with
+prefix matching and bm25 ranking, so operators can find a customer by
+name, email, mobile, address or postcode while they type.
+"""
+
+import re
+import sys
+import sqlite3
+import argparse
+from typing import Dict, List, Optional
+
+from db_migrations import DEFAULT_DB_PATH, SEARCH_COLUMNS, connect, migrate
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+MAX_QUERY_TERMS = 8
+# Best-ranked matches joined to customers per query (before the active filter)
+SEARCH_CANDIDATES = 1000
+
+# bm25 column weights - a name or email hit outranks one in the address
+SEARCH_WEIGHTS = {
+    "first_name": 10.0,
+    "last_name": 10.0,
+    "email": 8.0,
+    "mobile": 5.0,
+    "address": 1.0,
+    "postcode": 3.0,
+}
+
+SEARCH_RESULT_FIELDS = ["id", "email", "first_name", "last_name", "mobile", "address", "postcode"]
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match_query(q: str) -> Optional[str]:
+    """FTS5 MATCH expression for q: every term ANDed, the last one as a prefix
+
+    Splitting on non-word characters mirrors the unicode61 tokenizer, so
+    'john.sm' and 'john sm' both become "john" "sm"*, and user input can
+    never inject FTS5 query syntax. Only the term being typed is a prefix;
+    expanding finished words too would merge thousands of email tokens.
+    """
+    terms = _TERM.findall((q or '').lower())[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return " ".join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+
+
+def search_customers(conn: sqlite3.Connection, q: str, limit: int = DEFAULT_SEARCH_LIMIT,
+                     include_inactive: bool = False) -> List[Dict]:
+    """Best matching customers for q, highest ranked first"""
+    match = build_match_query(q)
+    if match is None:
+        return []
+
+    weights = ", ".join(str(SEARCH_WEIGHTS.get(column, 1.0)) for column in SEARCH_COLUMNS)
+    active = "" if include_inactive else "AND c.is_active = TRUE"
+    # ORDER BY rank lets FTS5 keep only the top SEARCH_CANDIDATES while it
+    # scores the matches, so every match is ranked but only the best are
+    # joined to customers, however broad the prefix
+    cursor = conn.execute(f'''
+        SELECT {", ".join(f"c.{f}" for f in SEARCH_RESULT_FIELDS)}, hits.score
+        FROM (
+            SELECT rowid, rank AS score
+            FROM customers_fts WHERE customers_fts MATCH ? AND rank MATCH ?
+            ORDER BY rank LIMIT ?
+        ) hits
+        JOIN customers c ON c.id = hits.rowid
+        WHERE 1 {active}
+        ORDER BY hits.score, c.id DESC
+        LIMIT ?
+    ''', (match, f"bm25({weights})", SEARCH_CANDIDATES, min(limit, MAX_SEARCH_LIMIT)))
+
+    results = []
+    for row in cursor.fetchall():
+        result = dict(zip(SEARCH_RESULT_FIELDS, row))
+        # bm25 is negative, lower is better - flip it for readability
+        result['score'] = round(-row[-1], 3)
+        results.append(result)
+    return results
+
+
+def rebuild_index(conn: sqlite3.Connection):
+    """Re-read every customer into the search index"""
+    conn.execute("INSERT INTO customers_fts (customers_fts) VALUES ('rebuild')")
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search customers by name, email, mobile, address or postcode")
+    parser.add_argument("query", nargs="?", help="search text (prefixes match)")
+    parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT)
+    parser.add_argument("--all", action="store_true", help="include inactive customers")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the search index from customers")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database path")
+    args = parser.parse_args()
+
+    if not args.query and not args.rebuild:
+        parser.error("a query or --rebuild is required")
+
+    migrate(args.db)
+    conn = connect(args.db)
+    try:
+        if args.rebuild:
+            rebuild_index(conn)
+            print("🔁 Search index rebuilt from the customers table")
+        if not args.query:
+            return
+
+        results = search_customers(conn, args.query, args.limit, args.all)
+        if not results:
+            print(f"🔍 No customers match '{args.query}'")
+            sys.exit(1)
+        print(f"🔍 {len(results)} customers match '{args.query}':")
+        for r in results:
+            name = f"{r['first_name'] or ''} {r['last_name'] or ''}".strip()
+            print(f"   #{r['id']:<7} {name:<28} {r['email']:<36} {r['mobile'] or '':<14} {r['postcode'] or ''}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Materialized customer statistics
+Triggers keep the stats, stats_area and stats_daily tables current in the
+same transaction as every customer write; this module reads them and can
+verify or rebuild them from the base tables.
+"""
+
+import sys
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict
+
+from db_migrations import (DEFAULT_DB_PATH, POSTCODE_DISTRICTS_CSV, STATS_AREA_SQL, connect,
+                           load_postcode_districts, migrate, rebuild_stats)
+
+
+def read_stats(conn: sqlite3.Connection, today: str) -> Dict:
+    """Headline counters - a handful of primary key lookups"""
+    counters = dict(conn.execute("SELECT key, value FROM stats").fetchall())
+    week_ago = (datetime.strptime(today, '%Y-%m-%d') - timedelta(days=7)).strftime('%Y-%m-%d')
+    new_today, new_week = conn.execute('''
+        SELECT COALESCE(SUM(CASE WHEN day = ? THEN new_customers END), 0),
+               COALESCE(SUM(new_customers), 0)
+        FROM stats_daily WHERE day >= ?
+    ''', (today, week_ago)).fetchone()
+    # stats_area is keyed by postcode sector; a sector entry in the lookup
+    # wins over its district, anything unmapped is 'Other'
+    areas = {
+        town: count for town, count in conn.execute('''
+            SELECT COALESCE(sector.town, district.town, 'Other') AS town, SUM(s.customers)
+            FROM stats_area s
+            LEFT JOIN postcode_districts sector ON sector.district = s.area
+            LEFT JOIN postcode_districts district ON district.district = substr(s.area, 1, length(s.area) - 2)
+            WHERE s.customers > 0
+            GROUP BY 1 ORDER BY 2 DESC
+        ''')
+    }
+    districts = {
+        district: count for district, count in conn.execute('''
+            SELECT substr(area, 1, length(area) - 2), SUM(customers) FROM stats_area
+            WHERE customers > 0 AND area <> ''
+            GROUP BY 1 ORDER BY 2 DESC
+        ''')
+    }
+    return {
+        'total_customers': counters.get('active_customers', 0),
+        'all_customers': counters.get('customers', 0),
+        'new_today': new_today,
+        'new_week': new_week,
+        'areas': areas,
+        'districts': districts,
+    }
+
+
+def compute_stats(conn: sqlite3.Connection) -> Dict:
+    """The same counters recomputed with full scans (for verification)"""
+    area = STATS_AREA_SQL.format(row="customers")
+    return {
+        'stats': dict(conn.execute('''
+            SELECT 'customers', COUNT(*) FROM customers
+            UNION ALL
+            SELECT 'active_customers', COUNT(*) FROM customers WHERE is_active = TRUE
+        ''').fetchall()),
+        'areas': dict(conn.execute(f'''
+            SELECT {area}, COUNT(*) FROM customers WHERE is_active = TRUE GROUP BY 1
+        ''').fetchall()),
+        'daily': dict(conn.execute('''
+            SELECT date(detected_at), COUNT(*) FROM new_customers_today
+            WHERE detected_at IS NOT NULL GROUP BY 1
+        ''').fetchall()),
+    }
+
+
+def verify_stats(conn: sqlite3.Connection) -> Dict:
+    """Differences between the materialized and recomputed counters"""
+    expected = compute_stats(conn)
+    actual = {
+        'stats': dict(conn.execute("SELECT key, value FROM stats").fetchall()),
+        'areas': dict(conn.execute("SELECT area, customers FROM stats_area WHERE customers <> 0").fetchall()),
+        'daily': dict(conn.execute("SELECT day, new_customers FROM stats_daily WHERE new_customers <> 0").fetchall()),
+    }
+    mismatches = {}
+    for table, values in expected.items():
+        for key in set(values) | set(actual[table]):
+            if values.get(key, 0) != actual[table].get(key, 0):
+                mismatches[f"{table}:{key}"] = (actual[table].get(key, 0), values.get(key, 0))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify or rebuild the materialized statistics")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database path")
+    parser.add_argument("--rebuild", action="store_true", help="recompute all counters from scratch")
+    parser.add_argument("--reload-districts", nargs="?", const=POSTCODE_DISTRICTS_CSV, metavar="CSV",
+                        help="reload the postcode district lookup (default: the shipped CSV)")
+    args = parser.parse_args()
+
+    migrate(args.db)
+    conn = connect(args.db)
+    conn.isolation_level = None
+    try:
+        if args.reload_districts:
+            conn.execute("BEGIN IMMEDIATE")
+            loaded = load_postcode_districts(conn, args.reload_districts)
+            conn.execute("COMMIT")
+            print(f"🗺️ {loaded} postcode districts loaded from {args.reload_districts}")
+
+        if args.rebuild:
+            conn.execute("BEGIN IMMEDIATE")
+            rebuild_stats(conn)
+            conn.execute("COMMIT")
+            print("🔁 Statistics rebuilt from the customers table")
+
+        mismatches = verify_stats(conn)
+        if mismatches:
+            print(f"❌ {len(mismatches)} counters out of step (stored, expected):")
+            for key, (stored, expected) in sorted(mismatches.items()):
+                print(f"   {key}: {stored} != {expected}")
+            sys.exit(1)
+
+        stats = read_stats(conn, datetime.now().strftime('%Y-%m-%d'))
+        print(f"✅ Statistics consistent: {stats['total_customers']} active customers, "
+              f"{stats['new_today']} new today, {len(stats['areas'])} towns in {len(stats['districts'])} districts")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
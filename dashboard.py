@@ -4,164 +4,590 @@ Web Dashboard for KEATchen Customer Monitor
 Shows real-time customer data and new customer alerts
 """
 
-from fastapi import FastAPI, Request
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Request, Query
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 import sqlite3
 import os
-from datetime import datetime, timedelta
+import io
+import asyncio
+import csv
+import zlib
+import hashlib
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import List, Optional, Tuple
 import json
-import pandas as pd
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as JSONResponse
+except ImportError:  # Optional speed-up - the stdlib encoder gives the same output
+    orjson = None
+    from fastapi.responses import JSONResponse
+from dashboard_db import DataVersion, ReadOnlyPool, ResponseCache, open_readonly
+from customer_stats import read_stats
+from db_migrations import ROLLUP_ALL_ACTIONS, ROLLUP_METRICS
+from customer_search import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, search_customers
+from metrics import (Counter, Histogram, RequestMetricsMiddleware, ScanMetrics, collect_customer_metrics,
+                     collect_db_metrics)
 
-app = FastAPI(title="KEATchen Customer Monitor Dashboard")
-templates = Jinja2Templates(directory="templates")
+app = FastAPI(title="KEATchen Customer Monitor Dashboard", default_response_class=JSONResponse)
+_templates = None
 
 # Configuration
 DATA_DIR = os.getenv("DATA_DIR", "/app/data")
 DB_PATH = os.path.join(DATA_DIR, "customers.db")
 
+# Latency of every request and pooled query, exposed on /metrics
+REQUEST_LATENCY = Histogram("keatchen_http_request_duration_seconds", "Dashboard time to response headers")
+REQUESTS = Counter("keatchen_http_requests_total", "Dashboard requests by route and status")
+QUERY_LATENCY = Histogram("keatchen_db_query_duration_seconds", "Dashboard database query time")
+POOL_WAIT = Histogram("keatchen_db_pool_wait_seconds", "Time waiting for a pooled connection")
+SCAN_METRICS = ScanMetrics()
+app.add_middleware(RequestMetricsMiddleware, latency=REQUEST_LATENCY, requests=REQUESTS)
+
+def observe_query(name: str, wait: float, seconds: float):
+    POOL_WAIT.observe(wait, query=name)
+    QUERY_LATENCY.observe(seconds, query=name)
+
+# Read-only connections shared by all requests, queried in the threadpool
+db = ReadOnlyPool(DB_PATH, observe=observe_query)
+# Aggregates are reused until the monitor next writes to the database
+data_version = DataVersion(DB_PATH)
+cache = ResponseCache(db, data_version)
+
+# Columns the customer APIs may return (fields=... is checked against this)
+CUSTOMER_API_FIELDS = [
+    'id', 'email', 'first_name', 'last_name', 'mobile', 'address', 'postcode',
+    'postcode_district', 'page', 'first_seen', 'last_updated', 'verified_email', 'verified_mobile',
+    'dob', 'city', 'county', 'total_orders', 'has_loyalty', 'has_coupons',
+]
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+EXPORT_CHUNK_SIZE = 1000
+
+# Server-sent events: how often the data_version is checked, and keep-alive interval
+EVENT_POLL_SECONDS = float(os.getenv("EVENT_POLL_SECONDS", "2"))
+EVENT_KEEPALIVE_SECONDS = 15
+EVENT_BATCH_SIZE = 100
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Validate a fields=a,b,c projection; id is always included for paging"""
+    if not fields:
+        return list(CUSTOMER_API_FIELDS)
+    requested = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in requested if f not in CUSTOMER_API_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return ['id'] + [f for f in requested if f != 'id']
+
+def customer_filters(postcode: Optional[str] = None, first_seen_from: Optional[str] = None,
+                     first_seen_to: Optional[str] = None, min_orders: Optional[int] = None,
+                     max_orders: Optional[int] = None,
+                     district: Optional[str] = None) -> Tuple[str, list]:
+    """WHERE clause + params for the customer filters (each backed by an index)"""
+    # Unary + keeps the planner off the low-selectivity is_active index, so
+    # unfiltered pages are a primary key range scan that stops at LIMIT
+    clauses = ["+is_active = TRUE"]
+    params = []
+    prefix = (postcode or '').strip().upper()
+    if prefix:
+        # Prefix match as an index range on upper(postcode)
+        clauses.append("upper(postcode) >= ? AND upper(postcode) < ?")
+        params.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+    if district:
+        # Parsed at ingest into the indexed postcode_district column
+        clauses.append("postcode_district = ?")
+        params.append(district.replace(' ', '').upper())
+    if first_seen_from:
+        clauses.append("first_seen >= ?")
+        params.append(first_seen_from)
+    if first_seen_to:
+        clauses.append("first_seen < ?")
+        params.append(first_seen_to)
+    if min_orders is not None:
+        clauses.append("total_orders >= ?")
+        params.append(min_orders)
+    if max_orders is not None:
+        clauses.append("total_orders <= ?")
+        params.append(max_orders)
+    return " AND ".join(clauses), params
+
+def get_templates():
+    """Jinja2 templates, loaded on the first page view (the JSON API never needs them)"""
+    global _templates
+    if _templates is None:
+        from fastapi.templating import Jinja2Templates
+        _templates = Jinja2Templates(directory="templates")
+    return _templates
+
+def encode_json(value) -> bytes:
+    """Compact UTF-8 JSON, via orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+# ETags embed the data_version generation, which restarts with the process
+BOOT_ID = os.urandom(4).hex()
+
+def query_last_modified(conn: sqlite3.Connection) -> Optional[str]:
+    """Latest write time recorded by the monitor (each MAX is an index lookup)"""
+    return conn.execute('''
+        SELECT MAX(ts) FROM (
+            SELECT MAX(changed_at) AS ts FROM changes
+            UNION ALL SELECT MAX(timestamp) FROM monitoring_log
+            UNION ALL SELECT MAX(detected_at) FROM new_customers_today
+        )
+    ''').fetchone()[0]
+
+async def response_validators(request: Request) -> dict:
+    """Strong ETag and Last-Modified headers for a response built from the DB
+
+    The ETag changes with every commit to the database (PRAGMA data_version),
+    so it is safe for columns the change feed does not track.
+    """
+    generation = await data_version.check_async()
+    last_modified = await cache.get(('last_modified',), query_last_modified)
+    today = datetime.now().strftime('%Y-%m-%d')
+    digest = hashlib.sha1(
+        f"{request.url.path}?{request.url.query}|{today}|{BOOT_ID}:{generation}".encode()
+    ).hexdigest()[:24]
+    
+    # no-cache: browsers may store the body but must revalidate every poll
+    headers = {"ETag": f'"{digest}"', "Cache-Control": "no-cache"}
+    if last_modified:
+        try:
+            modified = datetime.fromisoformat(last_modified).astimezone(timezone.utc)
+            headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+        except ValueError:
+            pass
+    return headers
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the client's If-None-Match already names this representation"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+@app.on_event("startup")
+def open_database_pool():
+    db.open()
+
+@app.on_event("shutdown")
+def close_database_pool():
+    db.close()
+    data_version.close()
+
+def query_dashboard_summary(conn: sqlite3.Connection, today: str) -> dict:
+    """Counts and recent scans for the main page"""
+    stats = read_stats(conn, today)
+    cursor = conn.cursor()
+    
+    # Get recent monitoring activity
+    cursor.execute('''
+        SELECT timestamp, new_customers, execution_time, errors
+        FROM monitoring_log 
+        ORDER BY timestamp DESC 
+        LIMIT 10
+    ''')
+    recent_scans = cursor.fetchall()
+    
+    return {
+        "total_customers": stats['total_customers'],
+        "new_today": stats['new_today'],
+        "new_week": stats['new_week'],
+        "recent_scans": recent_scans,
+    }
+
 @app.get("/", response_class=HTMLResponse)
 async def dashboard(request: Request):
     """Main dashboard page"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        
-        # Get total customers
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM customers WHERE is_active = TRUE")
-        total_customers = cursor.fetchone()[0]
-        
-        # Get new customers today
         today = datetime.now().strftime('%Y-%m-%d')
-        cursor.execute('''
-            SELECT COUNT(*) FROM new_customers_today 
-            WHERE date(detected_at) = ?
-        ''', (today,))
-        new_today = cursor.fetchone()[0]
-        
-        # Get new customers this week
-        week_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-        cursor.execute('''
-            SELECT COUNT(*) FROM new_customers_today 
-            WHERE date(detected_at) >= ?
-        ''', (week_ago,))
-        new_week = cursor.fetchone()[0]
+        summary = await cache.get(('summary', today), query_dashboard_summary, today)
         
-        # Get recent monitoring activity
-        cursor.execute('''
-            SELECT timestamp, new_customers, execution_time, errors
-            FROM monitoring_log 
-            ORDER BY timestamp DESC 
-            LIMIT 10
-        ''')
-        recent_scans = cursor.fetchall()
-        
-        conn.close()
-        
-        return templates.TemplateResponse("dashboard.html", {
+        return get_templates().TemplateResponse("dashboard.html", {
             "request": request,
-            "total_customers": total_customers,
-            "new_today": new_today,
-            "new_week": new_week,
-            "recent_scans": recent_scans,
+            **summary,
             "last_update": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         })
         
     except Exception as e:
         return HTMLResponse(f"<h1>Dashboard Error</h1><p>{e}</p>", status_code=500)
 
+def query_customers_page(conn: sqlite3.Connection, columns: List[str], where: str,
+                         params: list, after_id: int, limit: int) -> dict:
+    """One keyset page of customers"""
+    # Fetch one extra row to know whether another page exists
+    rows = conn.execute(f'''
+        SELECT {", ".join(columns)} FROM customers
+        WHERE {where} AND id > ?
+        ORDER BY id
+        LIMIT ?
+    ''', params + [after_id, limit + 1]).fetchall()
+    
+    customers = [dict(zip(columns, row)) for row in rows[:limit]]
+    next_after_id = customers[-1]['id'] if len(rows) > limit else None
+    
+    return {
+        "customers": customers,
+        "count": len(customers),
+        "next_after_id": next_after_id
+    }
+
 @app.get("/api/customers")
-async def get_customers():
-    """API endpoint to get all customers"""
+async def get_customers(
+    request: Request,
+    after_id: int = 0,
+    limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    fields: Optional[str] = None,
+    postcode: Optional[str] = None,
+    district: Optional[str] = None,
+    first_seen_from: Optional[str] = None,
+    first_seen_to: Optional[str] = None,
+    min_orders: Optional[int] = None,
+    max_orders: Optional[int] = None,
+):
+    """API endpoint to page through customers (keyset pagination on id)"""
+    try:
+        columns = parse_fields(fields)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    
+    try:
+        headers = await response_validators(request)
+        if etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        
+        where, params = customer_filters(postcode, first_seen_from, first_seen_to, min_orders, max_orders, district)
+        page = await db.run(query_customers_page, columns, where, params, after_id, limit)
+        return JSONResponse(page, headers=headers)
+        
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+def iter_export_rows(columns: List[str], where: str, params: list, fmt: str):
+    """Yield an export in encoded chunks, fetching EXPORT_CHUNK_SIZE rows at a time"""
+    # A dedicated connection: a long export must not hold a pool slot
+    conn = open_readonly(DB_PATH)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query("SELECT * FROM customers WHERE is_active = TRUE", conn)
+        cursor = conn.execute(
+            f"SELECT {', '.join(columns)} FROM customers WHERE {where} ORDER BY id", params
+        )
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(columns)
+            yield buffer.getvalue().encode('utf-8')
+        
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            if fmt == 'csv':
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                yield buffer.getvalue().encode('utf-8')
+            else:
+                yield b''.join(encode_json(dict(zip(columns, row))) + b'\n' for row in rows)
+    finally:
         conn.close()
+
+def gzip_chunks(chunks):
+    """Compress a byte stream incrementally into gzip format"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+@app.get("/api/customers/export")
+async def export_customers(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    fields: Optional[str] = None,
+    postcode: Optional[str] = None,
+    district: Optional[str] = None,
+    first_seen_from: Optional[str] = None,
+    first_seen_to: Optional[str] = None,
+    min_orders: Optional[int] = None,
+    max_orders: Optional[int] = None,
+):
+    """Stream every matching customer as NDJSON or CSV with flat memory use"""
+    try:
+        columns = parse_fields(fields)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    
+    where, params = customer_filters(postcode, first_seen_from, first_seen_to, min_orders, max_orders, district)
+    chunks = iter_export_rows(columns, where, params, format)
+    
+    filename = f"customers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/search")
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    include_inactive: bool = False,
+):
+    """API endpoint for full-text customer search (prefix matches, best first)"""
+    try:
+        headers = await response_validators(request)
+        if etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
         
-        return JSONResponse(df.to_dict('records'))
+        results = await db.run(search_customers, q, limit, include_inactive)
+        return JSONResponse({"query": q, "count": len(results), "results": results}, headers=headers)
         
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
+def query_new_customers(conn: sqlite3.Connection, today: str) -> List[dict]:
+    """Customers detected today, newest first"""
+    cursor = conn.execute('''
+        SELECT email, first_name, last_name, mobile, detected_at
+        FROM new_customers_today
+        WHERE date(detected_at) = ?
+        ORDER BY detected_at DESC
+    ''', (today,))
+    
+    new_customers = []
+    for row in cursor.fetchall():
+        new_customers.append({
+            'email': row[0],
+            'first_name': row[1],
+            'last_name': row[2],
+            'mobile': row[3],
+            'detected_at': row[4]
+        })
+    return new_customers
+
 @app.get("/api/new-customers")
-async def get_new_customers():
+async def get_new_customers(request: Request):
     """API endpoint to get new customers"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        headers = await response_validators(request)
+        if etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
         
         today = datetime.now().strftime('%Y-%m-%d')
-        cursor.execute('''
-            SELECT email, first_name, last_name, mobile, detected_at
-            FROM new_customers_today
-            WHERE date(detected_at) = ?
-            ORDER BY detected_at DESC
-        ''', (today,))
-        
-        new_customers = []
-        for row in cursor.fetchall():
-            new_customers.append({
-                'email': row[0],
-                'first_name': row[1],
-                'last_name': row[2],
-                'mobile': row[3],
-                'detected_at': row[4]
-            })
-        
-        conn.close()
-        return JSONResponse(new_customers)
+        new_customers = await cache.get(('new_customers', today), query_new_customers, today)
+        return JSONResponse(new_customers, headers=headers)
         
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
+def query_stats(conn: sqlite3.Connection, today: str) -> dict:
+    """Headline counts and town/postcode district distribution (materialized counters)"""
+    stats = read_stats(conn, today)
+    return {
+        "total_customers": stats['total_customers'],
+        "new_today": stats['new_today'],
+        "geographic_distribution": stats['areas'],
+        "postcode_districts": stats['districts']
+    }
+
 @app.get("/api/stats")
-async def get_stats():
+async def get_stats(request: Request):
     """API endpoint for dashboard statistics"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        headers = await response_validators(request)
+        if etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
         
-        # Total customers
-        cursor.execute("SELECT COUNT(*) FROM customers WHERE is_active = TRUE")
-        total = cursor.fetchone()[0]
-        
-        # New today
         today = datetime.now().strftime('%Y-%m-%d')
-        cursor.execute('''
-            SELECT COUNT(*) FROM new_customers_today 
-            WHERE date(detected_at) = ?
-        ''', (today,))
-        new_today = cursor.fetchone()[0]
-        
-        # Geographic distribution
-        cursor.execute('''
-            SELECT 
-                CASE 
-                    WHEN address LIKE '%East Kilbride%' THEN 'East Kilbride'
-                    WHEN address LIKE '%Blantyre%' THEN 'Blantyre'
-                    WHEN address LIKE '%Cambuslang%' THEN 'Cambuslang'
-                    ELSE 'Other'
-                END as location,
-                COUNT(*) as count
-            FROM customers 
-            WHERE is_active = TRUE
-            GROUP BY location
-        ''')
+        stats = await cache.get(('stats', today), query_stats, today)
+        return JSONResponse(stats, headers=headers)
         
-        geo_data = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        conn.close()
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+# Default /api/timeseries window per bucket size
+TIMESERIES_DEFAULT_DAYS = {"1h": 7, "1d": 90}
+
+def query_timeseries(conn: sqlite3.Connection, metric: str, bucket: str, action: str,
+                     start: str, end: Optional[str]) -> List[dict]:
+    """Pre-aggregated buckets from monitoring_rollup (a primary key range scan)"""
+    cursor = conn.execute('''
+        SELECT bucket_start, samples, total, min_value, max_value, p95
+        FROM monitoring_rollup
+        WHERE metric = ? AND bucket = ? AND action = ?
+          AND bucket_start >= ? AND bucket_start < ? AND samples > 0
+        ORDER BY bucket_start
+    ''', (metric, bucket, action, start, end or '~'))
+    return [
+        {
+            't': bucket_start,
+            'samples': samples,
+            'min': min_value,
+            'avg': total / samples,
+            'max': max_value,
+            'p95': p95,
+        }
+        for bucket_start, samples, total, min_value, max_value, p95 in cursor.fetchall()
+    ]
+
+@app.get("/api/timeseries")
+async def get_timeseries(
+    request: Request,
+    metric: str = "execution_time",
+    bucket: str = Query("1h", pattern="^(1h|1d)$"),
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    action: Optional[str] = None,
+):
+    """API endpoint for monitoring_log trends: min/avg/max/p95 per hour or day"""
+    if metric not in ROLLUP_METRICS:
+        return JSONResponse({"error": f"Unknown metric: {metric} (one of {', '.join(ROLLUP_METRICS)})"},
+                            status_code=400)
+    if not start:
+        start = (datetime.now() - timedelta(days=TIMESERIES_DEFAULT_DAYS[bucket])).strftime('%Y-%m-%d')
+    # Bucket starts are 'T'-separated, so accept either form of datetime
+    start = start.replace(' ', 'T')
+    end = end.replace(' ', 'T') if end else None
+    action = action or ROLLUP_ALL_ACTIONS
+    
+    try:
+        headers = await response_validators(request)
+        if etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
         
+        points = await cache.get(('timeseries', metric, bucket, action, start, end),
+                                 query_timeseries, metric, bucket, action, start, end)
         return JSONResponse({
-            "total_customers": total,
-            "new_today": new_today,
-            "geographic_distribution": geo_data
-        })
+            "metric": metric,
+            "bucket": bucket,
+            "action": action,
+            "from": start,
+            "to": end,
+            "points": points,
+        }, headers=headers)
         
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
+def query_latest_event_seq(conn: sqlite3.Connection) -> int:
+    """Sequence number new subscribers start after"""
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+def query_events(conn: sqlite3.Connection, after_seq: int) -> List[dict]:
+    """New-customer and scan-complete events published after after_seq"""
+    rows = conn.execute('''
+        SELECT c.seq, c.table_name,
+               n.email, n.first_name, n.last_name, n.mobile, n.detected_at,
+               m.timestamp, m.action, m.customers_found, m.new_customers, m.errors, m.execution_time
+        FROM changes c
+        LEFT JOIN new_customers_today n ON c.table_name = 'new_customers_today' AND n.id = c.row_id
+        LEFT JOIN monitoring_log m ON c.table_name = 'monitoring_log' AND m.id = c.row_id
+        WHERE c.table_name IN ('new_customers_today', 'monitoring_log') AND c.seq > ?
+        ORDER BY c.seq
+        LIMIT ?
+    ''', (after_seq, EVENT_BATCH_SIZE)).fetchall()
+    
+    events = []
+    for row in rows:
+        if row[1] == 'new_customers_today':
+            events.append({'seq': row[0], 'event': 'new_customer', 'data': {
+                'email': row[2],
+                'first_name': row[3],
+                'last_name': row[4],
+                'mobile': row[5],
+                'detected_at': row[6]
+            }})
+        else:
+            events.append({'seq': row[0], 'event': 'scan_complete', 'data': {
+                'timestamp': row[7],
+                'action': row[8],
+                'customers_found': row[9],
+                'new_customers': row[10],
+                'errors': row[11],
+                'execution_time': row[12]
+            }})
+    return events
+
+async def event_stream(request: Request, after_seq: int):
+    """Yield SSE frames; the DB is only queried when data_version moves"""
+    yield "retry: 5000\n\n"
+    seen_generation = None
+    idle = 0.0
+    
+    while not await request.is_disconnected():
+        generation = await data_version.check_async()
+        if generation != seen_generation:
+            seen_generation = generation
+            while True:
+                events = await db.run(query_events, after_seq)
+                for event in events:
+                    after_seq = event['seq']
+                    yield f"id: {after_seq}\nevent: {event['event']}\ndata: {encode_json(event['data']).decode('utf-8')}\n\n"
+                if len(events) < EVENT_BATCH_SIZE:
+                    break
+            idle = 0.0
+        elif idle >= EVENT_KEEPALIVE_SECONDS:
+            # Comment frame keeps proxies from closing an idle connection
+            yield ": keepalive\n\n"
+            idle = 0.0
+        
+        await asyncio.sleep(EVENT_POLL_SECONDS)
+        idle += EVENT_POLL_SECONDS
+
+@app.get("/api/events")
+async def stream_events(request: Request, after: Optional[int] = None):
+    """Server-sent events for new customers and completed scans"""
+    # Browsers resend the last id they saw when the connection drops
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        after_seq = int(last_event_id)
+    elif after is not None:
+        after_seq = after
+    else:
+        try:
+            after_seq = await db.run(query_latest_event_seq)
+        except sqlite3.Error as e:
+            return JSONResponse({"error": str(e)}, status_code=503)
+    
+    return StreamingResponse(
+        event_stream(request, after_seq),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def query_metrics(conn: sqlite3.Connection) -> List[str]:
+    """Scan and customer metrics (cached until the next write)"""
+    return SCAN_METRICS.collect(conn) + collect_customer_metrics(conn)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: scans, database, and dashboard latency"""
+    try:
+        lines = await cache.get(('metrics',), query_metrics)
+        lines = lines + await db.run(collect_db_metrics, DB_PATH)
+    except sqlite3.Error as e:
+        return Response(f"# database unavailable: {e}\n", status_code=503, media_type="text/plain")
+    
+    lines += [
+        "# HELP keatchen_dashboard_cache_requests_total Cached query lookups by result",
+        "# TYPE keatchen_dashboard_cache_requests_total counter",
+        f'keatchen_dashboard_cache_requests_total{{result="hit"}} {cache.hits}',
+        f'keatchen_dashboard_cache_requests_total{{result="miss"}} {cache.misses}',
+    ]
+    for metric in (REQUESTS, REQUEST_LATENCY, QUERY_LATENCY, POOL_WAIT):
+        lines += metric.render()
+    return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8081)
\ No newline at end of file
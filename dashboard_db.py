@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Read-only SQLite connection pool for the dashboard
+Queries run in Starlette's threadpool on a small set of long-lived
+read-only connections, so a slow query never blocks the event loop.
+"""
+
+import os
+import queue
+import sqlite3
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_SIZE = int(os.getenv("DASHBOARD_DB_POOL_SIZE", "4"))
+DB_BUSY_TIMEOUT_MS = 5000
+
+
+def open_readonly(db_path: str) -> sqlite3.Connection:
+    """Open a read-only connection usable from any thread"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+class ReadOnlyPool:
+    def __init__(self, db_path: str, size: int = DB_POOL_SIZE,
+                 observe: Optional[Callable[[str, float, float], None]] = None):
+        self.db_path = db_path
+        self.size = size
+        # Called with (query name, seconds waiting for a connection, seconds querying)
+        self.observe = observe
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Pre-open the pool at startup (missing database is retried lazily)"""
+        try:
+            for _ in range(self.size - self._created):
+                self._idle.put(self._new_connection())
+            logger.info(f"🗄️ Dashboard DB pool: {self.size} read-only connections")
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Database not ready ({e}) - connections will open on demand")
+
+    def _new_connection(self, only_below_size: bool = False):
+        with self._lock:
+            if only_below_size and self._created >= self.size:
+                return None
+            conn = open_readonly(self.db_path)
+            self._created += 1
+            return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, blocking (in a worker thread) while all are busy"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._new_connection(only_below_size=True) or self._idle.get()
+
+        broken = False
+        try:
+            yield conn
+        except sqlite3.DatabaseError:
+            broken = True
+            raise
+        finally:
+            if broken:
+                # Replace rather than reuse a possibly broken connection, so
+                # threads waiting on the pool are not left blocked
+                conn.close()
+                try:
+                    self._idle.put(open_readonly(self.db_path))
+                except sqlite3.Error:
+                    with self._lock:
+                        self._created -= 1
+            else:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+
+    def _call(self, fn: Callable, *args):
+        requested = time.perf_counter()
+        with self.connection() as conn:
+            started = time.perf_counter()
+            try:
+                return fn(conn, *args)
+            finally:
+                if self.observe:
+                    self.observe(fn.__name__, started - requested, time.perf_counter() - started)
+
+    async def run(self, fn: Callable, *args):
+        """Run fn(conn, *args) on a pooled connection in the threadpool"""
+        return await run_in_threadpool(self._call, fn, *args)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+class DataVersion:
+    """Cheap change detector built on PRAGMA data_version
+
+    data_version changes whenever another connection commits to the
+    database, so one PRAGMA on a dedicated connection tells us whether
+    anything cached could be stale.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.generation = 0
+        self._conn = None
+        self._last = None
+        self._lock = threading.Lock()
+
+    def check(self) -> int:
+        """Current generation; bumped every time the database has changed"""
+        with self._lock:
+            try:
+                if self._conn is None:
+                    self._conn = open_readonly(self.db_path)
+                version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            except sqlite3.Error:
+                # Database missing or unreadable - never serve from cache
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                self._last = None
+                self.generation += 1
+                return self.generation
+
+            if version != self._last:
+                self._last = version
+                self.generation += 1
+            return self.generation
+
+    async def check_async(self) -> int:
+        """check() in the threadpool, like pool queries, so the PRAGMA (or a
+        reconnect waiting on busy_timeout) never blocks the event loop"""
+        return await run_in_threadpool(self.check)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class ResponseCache:
+    """Query results cached until the database changes (no TTL)"""
+
+    def __init__(self, pool: ReadOnlyPool, version: DataVersion):
+        self.pool = pool
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+
+    async def get(self, key, fn: Callable, *args):
+        """Cached fn(conn, *args) for this key, recomputed after any DB change"""
+        # Read the generation before querying so a write racing the query
+        # is never cached as current
+        generation = await self.version.check_async()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == generation:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = await self.pool.run(fn, *args)
+        # Anything from an older generation is stale; keep the cache bounded
+        self._entries = {k: v for k, v in self._entries.items() if v[0] == generation}
+        self._entries[key] = (generation, value)
+        return value
@@ -0,0 +1,880 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for the KEATchen customer database
+Upgrades any existing customers.db in place, keyed on PRAGMA user_version
+"""
+
+import os
+import sys
+import csv
+import time
+import sqlite3
+import logging
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(os.getenv("DATA_DIR", "/app/data"), "customers.db")
+
+# Rows touched per backfill transaction - keeps write locks short while the
+# dashboard is reading the same database
+BACKFILL_BATCH_SIZE = 500
+
+# Canonical customers columns: the union of every schema the scrapers have
+# ever created (customer_monitor, bulletproof_scraper, init_database)
+CUSTOMER_COLUMNS = [
+    ("email", "TEXT UNIQUE NOT NULL"),
+    ("first_name", "TEXT"),
+    ("last_name", "TEXT"),
+    ("mobile", "TEXT"),
+    ("address", "TEXT"),
+    ("postcode", "TEXT"),
+    ("page", "INTEGER"),
+    ("first_seen", "TEXT"),
+    ("last_updated", "TEXT"),
+    ("verified_email", "TEXT"),
+    ("verified_mobile", "TEXT"),
+    ("dob", "TEXT"),
+    ("city", "TEXT"),
+    ("county", "TEXT"),
+    ("total_orders", "INTEGER DEFAULT 0"),
+    ("has_loyalty", "BOOLEAN DEFAULT FALSE"),
+    ("has_coupons", "BOOLEAN DEFAULT FALSE"),
+    ("is_active", "BOOLEAN DEFAULT TRUE"),
+    ("extraction_method", "TEXT"),
+]
+
+
+def connect(db_path: str = DEFAULT_DB_PATH, timeout: float = 30.0) -> sqlite3.Connection:
+    """Open a connection that waits for locks instead of failing immediately"""
+    conn = sqlite3.connect(db_path, timeout=timeout)
+    conn.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+    return conn
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    """Return the column names of a table (empty if it does not exist)"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def add_missing_columns(conn: sqlite3.Connection, table: str, columns: List[Tuple[str, str]]):
+    """ALTER TABLE ADD COLUMN for every column the table is missing
+
+    Adding a column only rewrites the schema entry, so this is O(1)
+    regardless of table size.
+    """
+    existing = set(table_columns(conn, table))
+    for name, definition in columns:
+        if name in existing:
+            continue
+        # SQLite cannot add UNIQUE/NOT NULL columns to an existing table
+        definition = definition.replace("UNIQUE", "").replace("NOT NULL", "").strip()
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+        logger.info(f"   ➕ {table}.{name} added")
+
+
+def backfill_in_batches(conn: sqlite3.Connection, table: str, set_clause: str,
+                        where_clause: str, params: tuple = (),
+                        batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Run an UPDATE in rowid-range batches, one short transaction each
+
+    Walking the rowid keeps every batch an index range scan, so the total
+    cost stays O(n) and the write lock is released between batches. The
+    WHERE clause must be idempotent so an interrupted backfill can resume.
+    """
+    max_rowid = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+    updated = 0
+    low = 0
+    while low < max_rowid:
+        high = low + batch_size
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                f"UPDATE {table} SET {set_clause} "
+                f"WHERE rowid > ? AND rowid <= ? AND ({where_clause})",
+                (*params, low, high)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        updated += cursor.rowcount
+        low = high
+    return updated
+
+
+# --- Migration steps -------------------------------------------------------
+# Each step is (version, description, schema, backfill). The schema function
+# runs in a single transaction and must be idempotent; the optional backfill
+# runs afterwards in batches. user_version is only bumped once both finish,
+# so a crash mid-backfill simply resumes on the next start.
+
+def _v1_unify_tables(conn: sqlite3.Connection):
+    """Create missing tables and add columns any older schema lacks"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            first_name TEXT,
+            last_name TEXT,
+            mobile TEXT,
+            address TEXT,
+            postcode TEXT,
+            page INTEGER,
+            first_seen TEXT,
+            last_updated TEXT,
+            verified_email TEXT,
+            verified_mobile TEXT,
+            dob TEXT,
+            city TEXT,
+            county TEXT,
+            total_orders INTEGER DEFAULT 0,
+            has_loyalty BOOLEAN DEFAULT FALSE,
+            has_coupons BOOLEAN DEFAULT FALSE,
+            is_active BOOLEAN DEFAULT TRUE,
+            extraction_method TEXT
+        )
+    ''')
+    add_missing_columns(conn, "customers", CUSTOMER_COLUMNS)
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS monitoring_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            action TEXT,
+            customers_found INTEGER,
+            new_customers INTEGER,
+            updated_customers INTEGER,
+            errors INTEGER,
+            execution_time REAL
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS new_customers_today (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            mobile TEXT,
+            detected_at TEXT,
+            notified BOOLEAN DEFAULT FALSE
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS extraction_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            page INTEGER,
+            customers_found INTEGER,
+            success BOOLEAN,
+            error_message TEXT
+        )
+    ''')
+
+
+def _v1_backfill(conn: sqlite3.Connection):
+    """Fill values older scripts never wrote"""
+    backfill_in_batches(conn, "customers", "is_active = TRUE", "is_active IS NULL")
+    backfill_in_batches(conn, "customers", "total_orders = 0", "total_orders IS NULL")
+    backfill_in_batches(
+        conn, "customers", "first_seen = last_updated",
+        "(first_seen IS NULL OR first_seen = '') AND last_updated IS NOT NULL"
+    )
+
+
+def _v2_indexes(conn: sqlite3.Connection):
+    """Index the columns every scan, export and dashboard query filters on"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_active_page ON customers(is_active, page)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_new_customers_detected ON new_customers_today(detected_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_monitoring_log_timestamp ON monitoring_log(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_extraction_log_page ON extraction_log(page, timestamp)")
+
+
+def _v3_orders(conn: sqlite3.Connection):
+    """Normalized orders table - one row per scraped order"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_no TEXT NOT NULL,
+            customer_id INTEGER NOT NULL REFERENCES customers(id),
+            order_date TEXT,
+            status TEXT,
+            method TEXT,
+            total_pence INTEGER,
+            discount TEXT,
+            UNIQUE(customer_id, order_no)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id, order_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_date ON orders(order_date)")
+
+
+def _v4_email_lower_index(conn: sqlite3.Connection):
+    """Case-insensitive email lookups (scrapers compare emails lowercased)"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_email_lower ON customers(lower(email))")
+
+
+# Columns whose changes are published to the change feed. Scan bookkeeping
+# (page, last_updated) is left out so routine sweeps do not flood it.
+CHANGE_TRACKED_COLUMNS = {
+    "customers": [
+        "email", "first_name", "last_name", "mobile", "address", "postcode",
+        "verified_email", "verified_mobile", "dob", "city", "county",
+        "total_orders", "has_loyalty", "has_coupons", "is_active",
+    ],
+    "orders": [
+        "order_no", "customer_id", "order_date", "status", "method", "total_pence", "discount",
+    ],
+}
+
+CHANGE_KEY_COLUMN = {"customers": "email", "orders": "order_no"}
+
+CHANGE_TIMESTAMP_SQL = "strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')"
+
+
+def create_change_triggers(conn: sqlite3.Connection, table: str):
+    """(Re)create the INSERT/UPDATE/DELETE triggers feeding the changes table"""
+    columns = CHANGE_TRACKED_COLUMNS[table]
+    key = CHANGE_KEY_COLUMN[table]
+    differs = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in columns)
+    changed_list = " || ".join(
+        f"CASE WHEN OLD.{c} IS NOT NEW.{c} THEN '{c},' ELSE '' END" for c in columns
+    )
+
+    for op in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_changes_{op}")
+
+    conn.execute(f'''
+        CREATE TRIGGER trg_{table}_changes_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO changes (table_name, op, row_id, row_key, changed_columns, changed_at)
+            VALUES ('{table}', 'INSERT', NEW.id, NEW.{key}, NULL, {CHANGE_TIMESTAMP_SQL});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER trg_{table}_changes_update AFTER UPDATE ON {table}
+        WHEN {differs}
+        BEGIN
+            INSERT INTO changes (table_name, op, row_id, row_key, changed_columns, changed_at)
+            VALUES ('{table}', 'UPDATE', NEW.id, NEW.{key}, rtrim({changed_list}, ','), {CHANGE_TIMESTAMP_SQL});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER trg_{table}_changes_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO changes (table_name, op, row_id, row_key, changed_columns, changed_at)
+            VALUES ('{table}', 'DELETE', OLD.id, OLD.{key}, NULL, {CHANGE_TIMESTAMP_SQL});
+        END
+    ''')
+
+
+def _v5_change_feed(conn: sqlite3.Connection):
+    """Trigger-driven change data capture for customers and orders"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            op TEXT NOT NULL,
+            row_id INTEGER,
+            row_key TEXT,
+            changed_columns TEXT,
+            changed_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_changes_changed_at ON changes(changed_at)")
+
+    # Each downstream job keeps its own read offset
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_consumers (
+            consumer TEXT PRIMARY KEY,
+            last_seq INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT
+        )
+    ''')
+
+    create_change_triggers(conn, "customers")
+    create_change_triggers(conn, "orders")
+
+
+# Customer fields whose previous values are kept in customer_history
+HISTORY_FIELDS = [
+    "email", "first_name", "last_name", "mobile", "address", "postcode",
+    "verified_email", "verified_mobile", "dob", "city", "county",
+    "total_orders", "has_loyalty", "has_coupons", "is_active",
+]
+
+
+def create_history_triggers(conn: sqlite3.Connection):
+    """(Re)create one AFTER UPDATE OF <field> trigger per history field"""
+    # A value is replaced at the scrape time of its successor, or now if the
+    # update carries no newer scrape time
+    replaced_at = (
+        "CASE WHEN COALESCE(NEW.last_updated, '') > COALESCE(OLD.last_updated, '') "
+        f"THEN NEW.last_updated ELSE {CHANGE_TIMESTAMP_SQL} END"
+    )
+    for field in HISTORY_FIELDS:
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_customers_history_{field}")
+        conn.execute(f'''
+            CREATE TRIGGER trg_customers_history_{field} AFTER UPDATE OF {field} ON customers
+            WHEN OLD.{field} IS NOT NEW.{field}
+            BEGIN
+                INSERT INTO customer_history (customer_id, field, old_value, valid_from, valid_to)
+                VALUES (
+                    OLD.id, '{field}', OLD.{field},
+                    COALESCE(
+                        (SELECT MAX(valid_to) FROM customer_history
+                         WHERE customer_id = OLD.id AND field = '{field}'),
+                        NULLIF(OLD.first_seen, '')
+                    ),
+                    {replaced_at}
+                );
+            END
+        ''')
+
+
+def _v6_customer_history(conn: sqlite3.Connection):
+    """Field-level customer history (SCD type 2: old value + validity range)"""
+    # old_value has no declared type so integers and flags keep their storage class
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS customer_history (
+            id INTEGER PRIMARY KEY,
+            customer_id INTEGER NOT NULL,
+            field TEXT NOT NULL,
+            old_value,
+            valid_from TEXT,
+            valid_to TEXT NOT NULL
+        )
+    ''')
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_customer_history_customer "
+        "ON customer_history(customer_id, valid_to)"
+    )
+    create_history_triggers(conn)
+
+
+def _v7_scan_generations(conn: sqlite3.Connection):
+    """Scan generation counters for mark-and-sweep deactivation"""
+    add_missing_columns(conn, "customers", [("last_seen_generation", "INTEGER")])
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scan_generations (
+            generation INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT,
+            started_at TEXT NOT NULL,
+            finished_at TEXT,
+            pages_expected INTEGER,
+            pages_ok INTEGER,
+            rows_seen INTEGER,
+            deactivated INTEGER,
+            status TEXT
+        )
+    ''')
+
+
+def _v8_customer_filter_indexes(conn: sqlite3.Connection):
+    """Indexes behind the dashboard's /api/customers filters"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_postcode ON customers(upper(postcode))")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_first_seen ON customers(first_seen)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_total_orders ON customers(total_orders)")
+
+
+def _v9_event_feed(conn: sqlite3.Connection):
+    """Publish new-customer alerts and scan results through the change feed"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_changes_table ON changes(table_name, seq)")
+
+    conn.execute("DROP TRIGGER IF EXISTS trg_new_customers_today_changes_insert")
+    conn.execute(f'''
+        CREATE TRIGGER trg_new_customers_today_changes_insert AFTER INSERT ON new_customers_today
+        BEGIN
+            INSERT INTO changes (table_name, op, row_id, row_key, changed_columns, changed_at)
+            VALUES ('new_customers_today', 'INSERT', NEW.id, NEW.email, NULL, {CHANGE_TIMESTAMP_SQL});
+        END
+    ''')
+
+    conn.execute("DROP TRIGGER IF EXISTS trg_monitoring_log_changes_insert")
+    conn.execute(f'''
+        CREATE TRIGGER trg_monitoring_log_changes_insert AFTER INSERT ON monitoring_log
+        BEGIN
+            INSERT INTO changes (table_name, op, row_id, row_key, changed_columns, changed_at)
+            VALUES ('monitoring_log', 'INSERT', NEW.id, NEW.action, NULL, {CHANGE_TIMESTAMP_SQL});
+        END
+    ''')
+
+
+# Area bucket used by the geographic counters ({row} is NEW, OLD or customers)
+_V10_AREA_SQL = (
+    "CASE WHEN {row}.address LIKE '%East Kilbride%' THEN 'East Kilbride' "
+    "WHEN {row}.address LIKE '%Blantyre%' THEN 'Blantyre' "
+    "WHEN {row}.address LIKE '%Cambuslang%' THEN 'Cambuslang' "
+    "ELSE 'Other' END"
+)
+
+
+def create_stats_triggers(conn: sqlite3.Connection, area_sql: str, area_columns: List[str]):
+    """(Re)create the triggers that keep stats/stats_area/stats_daily current"""
+    old_area = area_sql.format(row="OLD")
+    new_area = area_sql.format(row="NEW")
+    for name in ("insert", "delete", "update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_customers_stats_{name}")
+    for name in ("insert", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_new_customers_today_stats_{name}")
+
+    conn.execute(f'''
+        CREATE TRIGGER trg_customers_stats_insert AFTER INSERT ON customers
+        BEGIN
+            UPDATE stats SET value = value + 1 WHERE key = 'customers';
+            UPDATE stats SET value = value + 1 WHERE key = 'active_customers' AND NEW.is_active = TRUE;
+            INSERT INTO stats_area (area, customers) SELECT {new_area}, 1 WHERE NEW.is_active = TRUE
+                ON CONFLICT(area) DO UPDATE SET customers = customers + 1;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER trg_customers_stats_delete AFTER DELETE ON customers
+        BEGIN
+            UPDATE stats SET value = value - 1 WHERE key = 'customers';
+            UPDATE stats SET value = value - 1 WHERE key = 'active_customers' AND OLD.is_active = TRUE;
+            UPDATE stats_area SET customers = customers - 1 WHERE area = {old_area} AND OLD.is_active = TRUE;
+        END
+    ''')
+    # Fires only when activity or the area bucket actually moves
+    conn.execute(f'''
+        CREATE TRIGGER trg_customers_stats_update AFTER UPDATE OF is_active, {", ".join(area_columns)} ON customers
+        WHEN (OLD.is_active = TRUE) IS NOT (NEW.is_active = TRUE) OR {old_area} IS NOT {new_area}
+        BEGIN
+            UPDATE stats SET value = value + (NEW.is_active = TRUE) - (OLD.is_active = TRUE)
+                WHERE key = 'active_customers';
+            UPDATE stats_area SET customers = customers - 1 WHERE area = {old_area} AND OLD.is_active = TRUE;
+            INSERT INTO stats_area (area, customers) SELECT {new_area}, 1 WHERE NEW.is_active = TRUE
+                ON CONFLICT(area) DO UPDATE SET customers = customers + 1;
+        END
+    ''')
+
+    conn.execute('''
+        CREATE TRIGGER trg_new_customers_today_stats_insert AFTER INSERT ON new_customers_today
+        BEGIN
+            INSERT INTO stats_daily (day, new_customers) VALUES (date(NEW.detected_at), 1)
+                ON CONFLICT(day) DO UPDATE SET new_customers = new_customers + 1;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER trg_new_customers_today_stats_delete AFTER DELETE ON new_customers_today
+        BEGIN
+            UPDATE stats_daily SET new_customers = new_customers - 1 WHERE day = date(OLD.detected_at);
+        END
+    ''')
+
+
+def rebuild_stats(conn: sqlite3.Connection, area_sql: str = None):
+    """Recompute every materialized counter from the base tables
+
+    Call inside a write transaction so no trigger update interleaves.
+    """
+    area = (area_sql or STATS_AREA_SQL).format(row="customers")
+    conn.execute("DELETE FROM stats")
+    conn.execute("DELETE FROM stats_area")
+    conn.execute("DELETE FROM stats_daily")
+    conn.execute('''
+        INSERT INTO stats (key, value)
+        SELECT 'customers', COUNT(*) FROM customers
+        UNION ALL
+        SELECT 'active_customers', COUNT(*) FROM customers WHERE is_active = TRUE
+    ''')
+    conn.execute(f'''
+        INSERT INTO stats_area (area, customers)
+        SELECT {area}, COUNT(*) FROM customers WHERE is_active = TRUE GROUP BY 1
+    ''')
+    conn.execute('''
+        INSERT INTO stats_daily (day, new_customers)
+        SELECT date(detected_at), COUNT(*) FROM new_customers_today
+        WHERE detected_at IS NOT NULL GROUP BY 1
+    ''')
+
+
+def _v10_materialized_stats(conn: sqlite3.Connection):
+    """Counters maintained by triggers in the writer's own transaction"""
+    conn.execute("CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_area (
+            area TEXT PRIMARY KEY,
+            customers INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            day TEXT PRIMARY KEY,
+            new_customers INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    create_stats_triggers(conn, _V10_AREA_SQL, ["address"])
+    # Same transaction as the triggers, so no write is counted twice or missed
+    rebuild_stats(conn, _V10_AREA_SQL)
+
+
+
+# Offline postcode district -> town/council lookup shipped with the project.
+# Keys are districts ("G74") or, where a district spans towns, sectors ("G72 7").
+POSTCODE_DISTRICTS_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "postcode_districts.csv")
+
+# UK postcodes end in a 3-character inward code (digit + 2 letters), so the
+# district is whatever precedes it once spaces are removed and case folded
+_POSTCODE_SQL = "replace(upper(trim(postcode)), ' ', '')"
+_V11_DISTRICT_SQL = (
+    f"CASE WHEN length({_POSTCODE_SQL}) BETWEEN 5 AND 7 "
+    f"AND substr({_POSTCODE_SQL}, 1, 1) BETWEEN 'A' AND 'Z' "
+    f"AND substr({_POSTCODE_SQL}, -3, 1) BETWEEN '0' AND '9' "
+    f"THEN substr({_POSTCODE_SQL}, 1, length({_POSTCODE_SQL}) - 3) END"
+)
+_V11_SECTOR_SQL = f"postcode_district || ' ' || substr({_POSTCODE_SQL}, -3, 1)"
+
+# From v11 stats_area is keyed by postcode sector ('' when unparseable);
+# towns are resolved through postcode_districts when the counters are read
+_V11_AREA_SQL = "COALESCE({row}.postcode_sector, '')"
+STATS_AREA_SQL = _V11_AREA_SQL
+
+
+def load_postcode_districts(conn: sqlite3.Connection, path: str = POSTCODE_DISTRICTS_CSV) -> int:
+    """Replace the postcode_districts lookup with the rows in a CSV file"""
+    if not os.path.exists(path):
+        logger.warning(f"⚠️ {path} not found - postcode districts left unchanged")
+        return 0
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = [
+            (row['district'].strip().upper(), row['town'].strip(), (row.get('area') or '').strip() or None)
+            for row in csv.DictReader(f) if (row.get('district') or '').strip()
+        ]
+    conn.execute("DELETE FROM postcode_districts")
+    conn.executemany("INSERT OR REPLACE INTO postcode_districts (district, town, area) VALUES (?, ?, ?)", rows)
+    return len(rows)
+
+
+def _v11_postcode_districts(conn: sqlite3.Connection):
+    """Parsed, indexed postcode district/sector plus the town lookup table"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS postcode_districts (
+            district TEXT PRIMARY KEY,
+            town TEXT NOT NULL,
+            area TEXT
+        )
+    ''')
+    load_postcode_districts(conn)
+
+    # Virtual generated columns: parsed on every insert/update of postcode and
+    # stored only in their indexes, so no backfill pass over the table
+    existing = {row[1] for row in conn.execute("PRAGMA table_xinfo(customers)")}
+    if "postcode_district" not in existing:
+        conn.execute(f"ALTER TABLE customers ADD COLUMN postcode_district TEXT "
+                     f"GENERATED ALWAYS AS ({_V11_DISTRICT_SQL}) VIRTUAL")
+    if "postcode_sector" not in existing:
+        conn.execute(f"ALTER TABLE customers ADD COLUMN postcode_sector TEXT "
+                     f"GENERATED ALWAYS AS ({_V11_SECTOR_SQL}) VIRTUAL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_postcode_district ON customers(postcode_district)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_postcode_sector ON customers(postcode_sector)")
+
+    # Re-key the area counters from address text to postcode sector
+    create_stats_triggers(conn, _V11_AREA_SQL, ["postcode"])
+    rebuild_stats(conn, _V11_AREA_SQL)
+
+
+
+# Columns indexed for full-text customer search, in bm25 weight order
+_V12_SEARCH_COLUMNS = ["first_name", "last_name", "email", "mobile", "address", "postcode"]
+SEARCH_COLUMNS = _V12_SEARCH_COLUMNS
+
+
+def _v12_customer_search(conn: sqlite3.Connection):
+    """FTS5 index over customers, kept in sync by triggers"""
+    columns = ", ".join(_V12_SEARCH_COLUMNS)
+    new_values = ", ".join(f"NEW.{c}" for c in _V12_SEARCH_COLUMNS)
+    old_values = ", ".join(f"OLD.{c}" for c in _V12_SEARCH_COLUMNS)
+
+    # External content: the index stores only tokens, rows are read from
+    # customers. Prefix indexes make 2-3 character autocomplete a lookup.
+    conn.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+            {columns},
+            content='customers', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+
+    for name in ("insert", "delete", "update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_customers_fts_{name}")
+    conn.execute(f'''
+        CREATE TRIGGER trg_customers_fts_insert AFTER INSERT ON customers
+        BEGIN
+            INSERT INTO customers_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER trg_customers_fts_delete AFTER DELETE ON customers
+        BEGIN
+            INSERT INTO customers_fts (customers_fts, rowid, {columns}) VALUES ('delete', OLD.id, {old_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER trg_customers_fts_update AFTER UPDATE OF {columns} ON customers
+        BEGIN
+            INSERT INTO customers_fts (customers_fts, rowid, {columns}) VALUES ('delete', OLD.id, {old_values});
+            INSERT INTO customers_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+        END
+    ''')
+    conn.execute("INSERT INTO customers_fts (customers_fts) VALUES ('rebuild')")
+
+
+
+def _v13_scan_phases(conn: sqlite3.Connection):
+    """Per-phase durations of each logged scan"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scan_phases (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            log_id INTEGER NOT NULL REFERENCES monitoring_log(id),
+            phase TEXT NOT NULL,
+            seconds REAL NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_phases_log ON scan_phases(log_id)")
+
+
+# monitoring_log columns rolled up per time bucket for /api/timeseries
+_V14_ROLLUP_METRICS = ["execution_time", "customers_found", "new_customers", "updated_customers", "errors"]
+ROLLUP_METRICS = _V14_ROLLUP_METRICS
+# Bucket start for a monitoring_log timestamp ({ts}); strftime accepts both
+# the 'T' and space separated forms the scrapers have written
+_V14_ROLLUP_BUCKETS = {
+    "1h": "strftime('%Y-%m-%dT%H:00:00', {ts})",
+    "1d": "strftime('%Y-%m-%d', {ts})",
+}
+# Action value under which every action is rolled up together
+ROLLUP_ALL_ACTIONS = "*"
+
+
+def _rollup_values_sql(metric: str, bucket_sql: str, action_filter: str) -> str:
+    """Rows of one bucket (NEW's) for a metric; the day range keeps it an index scan"""
+    return (
+        f"SELECT {metric} AS v FROM monitoring_log "
+        f"WHERE timestamp >= substr(NEW.timestamp, 1, 10) AND timestamp < substr(NEW.timestamp, 1, 10) || '~' "
+        f"AND {bucket_sql.format(ts='timestamp')} = {bucket_sql.format(ts='NEW.timestamp')} "
+        f"AND {metric} IS NOT NULL {action_filter}"
+    )
+
+
+def _v14_monitoring_rollups(conn: sqlite3.Connection):
+    """Hourly/daily min/avg/max/p95 of monitoring_log, kept current by a trigger"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS monitoring_rollup (
+            metric TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            action TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            samples INTEGER NOT NULL,
+            total REAL,
+            min_value REAL,
+            max_value REAL,
+            p95 REAL,
+            PRIMARY KEY (metric, bucket, action, bucket_start)
+        ) WITHOUT ROWID
+    ''')
+
+    # Each insert recomputes only the hour and day it lands in (exact p95 by
+    # nearest rank), so reads never touch monitoring_log
+    statements = []
+    for bucket, bucket_sql in _V14_ROLLUP_BUCKETS.items():
+        for action_sql, action_filter in (("NEW.action", "AND action IS NEW.action"),
+                                          (f"'{ROLLUP_ALL_ACTIONS}'", "")):
+            for metric in _V14_ROLLUP_METRICS:
+                values = _rollup_values_sql(metric, bucket_sql, action_filter)
+                statements.append(f'''
+            INSERT INTO monitoring_rollup (metric, bucket, action, bucket_start, samples, total, min_value, max_value, p95)
+            SELECT '{metric}', '{bucket}', COALESCE({action_sql}, ''), {bucket_sql.format(ts='NEW.timestamp')},
+                   COUNT(v), SUM(v), MIN(v), MAX(v),
+                   (SELECT v FROM ({values}) ORDER BY v
+                    LIMIT 1 OFFSET (SELECT MAX((COUNT(*) * 95 + 99) / 100 - 1, 0) FROM ({values})))
+            FROM ({values})
+            WHERE {bucket_sql.format(ts='NEW.timestamp')} IS NOT NULL
+            ON CONFLICT (metric, bucket, action, bucket_start) DO UPDATE SET
+                samples = excluded.samples, total = excluded.total, min_value = excluded.min_value,
+                max_value = excluded.max_value, p95 = excluded.p95;''')
+
+    conn.execute("DROP TRIGGER IF EXISTS trg_monitoring_log_rollup_insert")
+    conn.execute(f'''
+        CREATE TRIGGER trg_monitoring_log_rollup_insert AFTER INSERT ON monitoring_log
+        BEGIN{"".join(statements)}
+        END
+    ''')
+
+    # Existing history in one pass per bucket size (window functions are
+    # fine here, just not inside triggers)
+    conn.execute("DELETE FROM monitoring_rollup")
+    for bucket, bucket_sql in _V14_ROLLUP_BUCKETS.items():
+        for metric in _V14_ROLLUP_METRICS:
+            for action_sql in ("COALESCE(action, '')", f"'{ROLLUP_ALL_ACTIONS}'"):
+                conn.execute(f'''
+                    INSERT INTO monitoring_rollup (metric, bucket, action, bucket_start, samples, total, min_value, max_value, p95)
+                    SELECT '{metric}', '{bucket}', grp, start, COUNT(*), SUM(v), MIN(v), MAX(v),
+                           MIN(CASE WHEN rn >= (n * 95 + 99) / 100 THEN v END)
+                    FROM (
+                        SELECT {action_sql} AS grp, {bucket_sql.format(ts='timestamp')} AS start, {metric} AS v,
+                               ROW_NUMBER() OVER w AS rn, COUNT(*) OVER (PARTITION BY {action_sql}, {bucket_sql.format(ts='timestamp')}) AS n
+                        FROM monitoring_log
+                        WHERE {metric} IS NOT NULL AND {bucket_sql.format(ts='timestamp')} IS NOT NULL
+                        WINDOW w AS (PARTITION BY {action_sql}, {bucket_sql.format(ts='timestamp')} ORDER BY {metric})
+                    )
+                    GROUP BY grp, start
+                ''')
+
+
+def _v15_scheduled_jobs(conn: sqlite3.Connection):
+    """Last run of each scheduler job, so catch-up survives restarts"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            job TEXT PRIMARY KEY,
+            last_started TEXT,
+            last_finished TEXT,
+            last_status TEXT,
+            last_duration REAL,
+            runs INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _v16_scan_leases(conn: sqlite3.Connection):
+    """Work batches and page-range leases shared by several monitor nodes"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scan_batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            generation INTEGER REFERENCES scan_generations(generation),
+            created_at TEXT NOT NULL,
+            created_by TEXT,
+            status TEXT NOT NULL DEFAULT 'running',
+            finished_at TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_batches_kind ON scan_batches(kind, id)")
+    # expires_at is epoch seconds; fence goes up with every claim, and only
+    # the current holder's token is accepted when recording progress
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scan_leases (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            batch_id INTEGER NOT NULL REFERENCES scan_batches(id),
+            first_page INTEGER NOT NULL,
+            last_page INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            owner TEXT,
+            expires_at REAL,
+            fence INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_page INTEGER NOT NULL,
+            pages_ok INTEGER NOT NULL DEFAULT 0,
+            finished_at TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scan_leases_batch ON scan_leases(batch_id, status, first_page)")
+    # Workers on different nodes can meet the same sign-up; alert once per email
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_new_customers_email ON new_customers_today(email)")
+
+
+def _v17_sweep_id_watermark(conn: sqlite3.Connection):
+    """Highest customer id at the start of each sweep, the rows it may deactivate"""
+    add_missing_columns(conn, "scan_generations", [("max_customer_id", "INTEGER")])
+
+
+def _v18_consumer_tables(conn: sqlite3.Connection):
+    """Tables each change feed consumer reads (NULL = all), for per-table compaction"""
+    add_missing_columns(conn, "change_consumers", [("tables", "TEXT")])
+    # Highest seq of each table dropped by retention: a reader behind it
+    # missed changes (the oldest retained seq no longer says so once tables
+    # are compacted separately)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_expiry (
+            table_name TEXT PRIMARY KEY,
+            expired_through INTEGER NOT NULL
+        )
+    ''')
+
+
+MIGRATIONS: List[Tuple[int, str, Callable, Optional[Callable]]] = [
+    (1, "unify customers schema across all scripts", _v1_unify_tables, _v1_backfill),
+    (2, "add lookup indexes", _v2_indexes, None),
+    (3, "add normalized orders table", _v3_orders, None),
+    (4, "index lowercased email", _v4_email_lower_index, None),
+    (5, "add trigger-driven change feed", _v5_change_feed, None),
+    (6, "add field-level customer history", _v6_customer_history, None),
+    (7, "add scan generations for mark-and-sweep", _v7_scan_generations, None),
+    (8, "index customer filter columns", _v8_customer_filter_indexes, None),
+    (9, "publish alerts and scan results to the change feed", _v9_event_feed, None),
+    (10, "add trigger-maintained statistics tables", _v10_materialized_stats, None),
+    (11, "add postcode district lookup and re-key area statistics", _v11_postcode_districts, None),
+    (12, "add full-text customer search index", _v12_customer_search, None),
+    (13, "record scan phase timings", _v13_scan_phases, None),
+    (14, "add hourly/daily monitoring_log rollups", _v14_monitoring_rollups, None),
+    (15, "persist scheduler job state", _v15_scheduled_jobs, None),
+    (16, "add scan work leases for multi-node sweeps", _v16_scan_leases, None),
+    (17, "limit sweeps to customers that existed when they started", _v17_sweep_id_watermark, None),
+    (18, "record the tables each change consumer reads", _v18_consumer_tables, None),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Return the PRAGMA user_version of a database"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_path: str = DEFAULT_DB_PATH) -> int:
+    """Upgrade a database in place to SCHEMA_VERSION and return the version"""
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+
+    # Autocommit mode - every transaction below is explicit
+    conn = sqlite3.connect(db_path, timeout=30.0, isolation_level=None)
+    try:
+        conn.execute("PRAGMA busy_timeout = 30000")
+        # WAL lets the dashboard keep reading while DDL and backfills commit
+        conn.execute("PRAGMA journal_mode = WAL")
+
+        current = get_schema_version(conn)
+        if current >= SCHEMA_VERSION:
+            return current
+
+        for version, description, schema, backfill in MIGRATIONS:
+            if version <= current:
+                continue
+
+            start_time = time.time()
+            logger.info(f"🛠️ Migrating schema to v{version}: {description}")
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                schema(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            if backfill:
+                backfill(conn)
+
+            conn.execute(f"PRAGMA user_version = {version}")
+            current = version
+            logger.info(f"✅ Schema v{version} applied in {time.time() - start_time:.2f}s")
+
+        return current
+    finally:
+        conn.close()
+
+
+def main():
+    """Migrate the database given on the command line (or DATA_DIR/customers.db)"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB_PATH
+    version = migrate(db_path)
+    print(f"✅ {db_path} is at schema v{version}")
+
+
+if __name__ == "__main__":
+    main()
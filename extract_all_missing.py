@@ -1,26 +1,25 @@
 #!/usr/bin/env python3
 """
 Extract ALL missing customers - headless mode with extended timeouts
+Only the pages the repair planner finds missing or short are rescanned
 """
 
-import json
 import time
 import os
 import sqlite3
 from datetime import datetime
 from playwright.sync_api import sync_playwright
+from db_migrations import DEFAULT_DB_PATH, migrate
+from scan_generations import RUNNING_GENERATION_SQL
+from repair_planner import log_page_result, parse_reported_total, plan_repair, print_plan, read_page_count
 
 def extract_all_missing():
     print("🎯 EXTRACTING ALL REMAINING CUSTOMERS")
     print("=====================================")
     
-    # Missing pages that we haven't extracted
-    missing_pages = [14, 15, 16, 17, 18, 19, 21, 22, 23, 24]
-    print(f"📋 Missing pages: {missing_pages}")
-    print(f"📊 Estimated customers: ~{len(missing_pages) * 20}")
-    
     # Database setup
-    db_path = "/app/data/customers.db"
+    db_path = DEFAULT_DB_PATH
+    migrate(db_path)
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
@@ -64,9 +63,21 @@ def extract_all_missing():
             # Navigate to customers
             page.goto("https://keatchenunited.app4food.co.uk/admin/Customer", wait_until='networkidle')
             
+            # Compare the panel's totals with the database and extraction log
+            total_pages = read_page_count(page)
+            reported_total = parse_reported_total(page.inner_text('body'), total_pages)
+            conn = sqlite3.connect(db_path)
+            plan = plan_repair(conn, total_pages, reported_total)
+            conn.close()
+            print_plan(plan)
+            
+            missing_pages = [entry['page'] for entry in plan['pages']]
+            if not missing_pages:
+                return
+            
             # Extract each missing page
             for page_num in missing_pages:
-                print(f"\\n📄 === PAGE {page_num}/{max(missing_pages)} ===")
+                print(f"\\n📄 === PAGE {page_num}/{total_pages} ===")
                 
                 try:
                     # Navigate to page
@@ -87,7 +98,7 @@ def extract_all_missing():
                                 continue
                             
                             text = row.inner_text()
-                            if 'Firstname' in text or 'of 27' in text:
+                            if 'Firstname' in text or f'of {total_pages}' in text:
                                 continue
                             
                             customer = {
@@ -105,11 +116,17 @@ def extract_all_missing():
                             conn = sqlite3.connect(db_path)
                             cursor = conn.cursor()
                             
-                            cursor.execute('''
-                                INSERT OR IGNORE INTO customers (
+                            # Existing rows move to the page they are on now
+                            cursor.execute(f'''
+                                INSERT INTO customers (
                                     email, first_name, last_name, mobile, address,
-                                    postcode, page, first_seen, last_updated, is_active
-                                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                    postcode, page, first_seen, last_updated, is_active,
+                                    last_seen_generation
+                                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {RUNNING_GENERATION_SQL})
+                                ON CONFLICT(email) DO UPDATE SET
+                                    page = excluded.page,
+                                    last_updated = excluded.last_updated,
+                                    is_active = TRUE
                             ''', (
                                 customer['email'], customer['first_name'], customer['last_name'],
                                 customer['mobile'], customer['address'], customer['postcode'],
@@ -128,9 +145,11 @@ def extract_all_missing():
                             continue
                     
                     print(f"📊 Page {page_num}: {page_new} customers | Total new: {total_new}")
+                    log_page_result(db_path, page_num, page_new, page_new > 0)
                     
                 except Exception as e:
                     print(f"❌ Page {page_num} failed: {e}")
+                    log_page_result(db_path, page_num, 0, False, str(e))
                     continue
             
             # Final database count
@@ -8,6 +8,7 @@ import time
 import os
 from datetime import datetime
 from playwright.sync_api import sync_playwright
+from customer_journal import CustomerJournal, record_email
 
 def extract_customer_from_modal(page, customer_basic):
     """Extract detailed customer data from modal"""
@@ -115,15 +116,14 @@ def main():
     customers_data = []
     scraped_emails = set()
     
-    # Load existing data
-    if os.path.exists('customer_data/customers_complete.json'):
-        try:
-            with open('customer_data/customers_complete.json', 'r') as f:
-                customers_data = json.load(f)
-                scraped_emails = {c.get('email', '').lower() for c in customers_data}
-                print(f"📚 Loaded {len(customers_data)} existing customers")
-        except:
-            pass
+    # Load existing data (snapshot plus journal tail)
+    journal = CustomerJournal('customer_data/customers_complete.json')
+    try:
+        customers_data = journal.load()
+        scraped_emails = {record_email(c) for c in customers_data}
+        print(f"📚 Loaded {len(customers_data)} existing customers")
+    except Exception:
+        pass
     
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)  # Fast headless mode
@@ -158,6 +158,7 @@ def main():
                 # Get customer rows on current page
                 customer_rows = page.query_selector_all('tbody tr')
                 page_scraped = 0
+                page_customers = []
                 
                 for i, row in enumerate(customer_rows):
                     try:
@@ -204,6 +205,7 @@ def main():
                             
                             # Add to database
                             customers_data.append(customer)
+                            page_customers.append(customer)
                             scraped_emails.add(customer['email'].lower())
                             page_scraped += 1
                             total_scraped += 1
@@ -216,10 +218,8 @@ def main():
                 
                 print(f"📊 Page {page_num}: {page_scraped} new customers | Total: {total_scraped}")
                 
-                # Save progress every page
-                os.makedirs('customer_data', exist_ok=True)
-                with open('customer_data/customers_complete.json', 'w') as f:
-                    json.dump(customers_data, f, indent=2)
+                # Save progress every page - append only this page's customers
+                journal.append(page_customers)
                 
                 # Go to next page
                 if page_num < 27:
@@ -248,6 +248,7 @@ def main():
         except Exception as e:
             print(f"❌ Main error: {e}")
         finally:
+            journal.close()
             browser.close()
 
 if __name__ == "__main__":
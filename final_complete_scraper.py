@@ -9,6 +9,7 @@ import time
 import os
 from datetime import datetime
 from playwright.sync_api import sync_playwright
+from customer_journal import CustomerJournal, record_email
 
 class FinalCustomerScraper:
     def __init__(self):
@@ -24,33 +25,29 @@ class FinalCustomerScraper:
         self.output_dir = "customer_data"
         
         os.makedirs(self.output_dir, exist_ok=True)
+        self.journal = CustomerJournal(f"{self.output_dir}/customers_mcp.json")
+        self.saved_count = 0
         self.load_existing_data()
 
     def load_existing_data(self):
-        """Load existing scraped data"""
+        """Load existing scraped data (snapshot plus journal tail)"""
         try:
-            if os.path.exists(f"{self.output_dir}/customers_mcp.json"):
-                with open(f"{self.output_dir}/customers_mcp.json", 'r') as f:
-                    self.customers_data = json.load(f)
-                    self.scraped_emails = {c.get('email', '').lower() for c in self.customers_data}
-                    print(f"📚 Starting with {len(self.customers_data)} existing customers")
+            self.customers_data = self.journal.load()
+            self.scraped_emails = {record_email(c) for c in self.customers_data}
+            self.saved_count = len(self.customers_data)
+            if self.customers_data:
+                print(f"📚 Starting with {len(self.customers_data)} existing customers")
         except Exception as e:
             print(f"Error loading: {e}")
 
     def save_progress(self):
-        """Save current progress"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        # Save main database
-        with open(f"{self.output_dir}/customers_mcp.json", 'w') as f:
-            json.dump(self.customers_data, f, indent=2)
-        
-        # Create backup
-        backup_file = f"{self.output_dir}/backup_{timestamp}.json"
-        with open(backup_file, 'w') as f:
-            json.dump(self.customers_data, f, indent=2)
+        """Save current progress - appends only customers added since the last save"""
+        new_customers = self.customers_data[self.saved_count:]
+        self.journal.append(new_customers)
+        self.journal.sync()
+        self.saved_count = len(self.customers_data)
         
-        print(f"💾 Progress saved: {len(self.customers_data)} customers")
+        print(f"💾 Progress saved: {len(self.customers_data)} customers (+{len(new_customers)} journaled)")
 
     def extract_customer_details_from_modal(self, page, basic_customer):
         """Extract complete customer details from modal"""
@@ -322,6 +319,8 @@ class FinalCustomerScraper:
                 # Save progress even if error
                 self.save_progress()
             finally:
+                # Fold the journal back into customers_mcp.json
+                self.journal.close()
                 browser.close()
 
     def create_final_exports(self):
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Streaming importer for the legacy customer JSON dumps
+Parses large JSON arrays incrementally and loads them into SQLite in batches
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import time
+import sqlite3
+import argparse
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from db_migrations import DEFAULT_DB_PATH, connect, migrate
+from customer_orders import UPSERT_ORDER_SQL, order_rows
+from scan_generations import RUNNING_GENERATION_SQL
+
+# Every file shape the scrapers have written over time
+LEGACY_PATTERNS = [
+    "customer_data/customers.json",
+    "customer_data/customers_complete.json",
+    "customer_data/customers_mcp.json",
+    "customer_data/backup_*.json",
+]
+
+READ_CHUNK_SIZE = 1 << 16
+IMPORT_BATCH_SIZE = 1000
+
+_SEPARATOR = re.compile(r'[\s,]*')
+_WHITESPACE = re.compile(r'\s*')
+# A bare literal or number cut off by the end of the buffer ("tru", "-", "1e")
+_TRUNCATED_TOKEN = re.compile(r'[\w.+-]*\Z')
+
+# Columns written by the importer, in VALUES order
+CUSTOMER_FIELDS = [
+    'email', 'first_name', 'last_name', 'mobile', 'address', 'postcode',
+    'page', 'first_seen', 'last_updated', 'verified_email', 'verified_mobile',
+    'dob', 'city', 'county', 'total_orders', 'has_loyalty', 'has_coupons',
+]
+
+# Text columns where the most recently scraped non-empty value wins
+_NEWEST_WINS = [
+    'first_name', 'last_name', 'mobile', 'address', 'postcode', 'page',
+    'verified_email', 'verified_mobile', 'dob', 'city', 'county',
+]
+
+
+def _newest_wins(column: str) -> str:
+    return (
+        f"{column} = CASE WHEN excluded.{column} IS NOT NULL AND excluded.{column} <> '' "
+        f"AND (customers.{column} IS NULL OR customers.{column} = '' "
+        f"OR COALESCE(excluded.last_updated, '') >= COALESCE(customers.last_updated, '')) "
+        f"THEN excluded.{column} ELSE customers.{column} END"
+    )
+
+
+UPSERT_CUSTOMER_SQL = f'''
+    INSERT INTO customers (
+        {", ".join(CUSTOMER_FIELDS)}, is_active, extraction_method, last_seen_generation
+    ) VALUES ({", ".join("?" for _ in CUSTOMER_FIELDS)}, TRUE, 'json_import', {RUNNING_GENERATION_SQL})
+    ON CONFLICT(email) DO UPDATE SET
+        {", ".join(_newest_wins(column) for column in _NEWEST_WINS)},
+        first_seen = CASE WHEN excluded.first_seen <> ''
+            AND (customers.first_seen IS NULL OR customers.first_seen = ''
+                 OR excluded.first_seen < customers.first_seen)
+            THEN excluded.first_seen ELSE customers.first_seen END,
+        last_updated = MAX(COALESCE(customers.last_updated, ''), COALESCE(excluded.last_updated, '')),
+        total_orders = MAX(COALESCE(customers.total_orders, 0), excluded.total_orders),
+        has_loyalty = customers.has_loyalty OR excluded.has_loyalty,
+        has_coupons = customers.has_coupons OR excluded.has_coupons
+'''
+
+
+def iter_json_array(path: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator:
+    """Yield the elements of a top-level JSON array without loading the file
+
+    Only one element plus one read chunk is held in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        consumed = 0  # characters dropped from the front of the buffer
+        while not buffer:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            buffer = chunk.lstrip()
+            consumed += len(chunk) - len(buffer)
+        if buffer[0] != '[':
+            raise ValueError(f"{path} does not contain a JSON array")
+
+        pos = 1
+        eof = False
+        read_size = chunk_size
+
+        while True:
+            pos = _SEPARATOR.match(buffer, pos).end()
+
+            if pos >= len(buffer):
+                if eof:
+                    raise ValueError(f"{path}: unexpected end of file")
+                consumed += pos
+                buffer = buffer[pos:] + f.read(read_size)
+                pos = 0
+                eof = len(buffer) == 0
+                continue
+
+            if buffer[pos] == ']':
+                return
+
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # A value is only complete once the separator after it has
+                # been read: a number cut at the chunk end ("12." of "12.5")
+                # still decodes, as a prefix
+                follow = _WHITESPACE.match(buffer, end).end()
+                truncated = follow >= len(buffer) or _TRUNCATED_TOKEN.match(buffer, end) is not None
+            except json.JSONDecodeError as e:
+                # Only a value running into the end of the buffer may be
+                # completed by reading on; anything else is corrupt, and
+                # reading on would pull the rest of the file into memory
+                truncated = (e.msg.startswith('Unterminated string')
+                             or _TRUNCATED_TOKEN.match(buffer, e.pos) is not None)
+                if eof or not truncated:
+                    raise ValueError(f"{path}: {e.msg} at character {consumed + e.pos}") from e
+
+            if truncated:
+                if eof:
+                    raise ValueError(f"{path}: unexpected end of file")
+                chunk = f.read(read_size)
+                eof = not chunk
+                consumed += pos
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                # Grow reads for elements larger than one chunk
+                read_size *= 2
+                continue
+            if buffer[follow] not in ',]':
+                raise ValueError(f"{path}: expected ',' or ']' at character {consumed + follow}")
+
+            read_size = chunk_size
+            pos = end
+            yield item
+
+
+def iter_jsonl(path: str) -> Iterator:
+    """Yield one JSON object per line, ignoring a torn final line"""
+    # Binary lines: a tear can split a UTF-8 character, which json.loads
+    # rejects like any other partial line
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # A crash mid-append can leave a partial last line
+                continue
+
+
+def iter_records(path: str) -> Iterator:
+    """Yield records from a JSON array file or a JSONL journal"""
+    if path.endswith('.jsonl'):
+        return iter_jsonl(path)
+    return iter_json_array(path)
+
+
+def with_journals(paths: List[str]) -> List[str]:
+    """Follow each snapshot with its append-only journal, if one exists"""
+    expanded = []
+    for path in paths:
+        if path not in expanded:
+            expanded.append(path)
+        journal = os.path.splitext(path)[0] + '.jsonl'
+        if not path.endswith('.jsonl') and os.path.exists(journal) and journal not in expanded:
+            expanded.append(journal)
+    return expanded
+
+
+def _first(*values):
+    """Return the first non-empty value"""
+    for value in values:
+        if value not in (None, ''):
+            return value
+    return ''
+
+
+def _has_content(value) -> bool:
+    if isinstance(value, dict):
+        return bool(value.get('content') or value.get('raw_text'))
+    return bool(value)
+
+
+def normalize_customer(record: Dict) -> Optional[Dict]:
+    """Map any legacy customer record shape onto the customers table columns"""
+    if not isinstance(record, dict):
+        return None
+
+    contact = record.get('contact_details')
+    if not isinstance(contact, dict):
+        contact = {}
+
+    email = str(_first(record.get('email'), record.get('verified_email'),
+                       contact.get('verified_email'), contact.get('email_verified'))).strip()
+    if '@' not in email:
+        return None
+
+    scraped_at = _first(record.get('scraped_at'), record.get('extracted_at'),
+                        record.get('last_updated'), record.get('first_seen'))
+    orders = record.get('orders') if isinstance(record.get('orders'), list) else []
+
+    return {
+        'email': email,
+        'first_name': _first(record.get('first_name'), contact.get('verified_firstname'), contact.get('firstname')),
+        'last_name': _first(record.get('last_name'), contact.get('verified_lastname'), contact.get('lastname')),
+        'mobile': _first(record.get('mobile'), contact.get('verified_mobile'), contact.get('mobile_verified')),
+        'address': _first(record.get('address'), contact.get('address1')),
+        'postcode': _first(record.get('postcode'), contact.get('verified_postcode'), contact.get('postcode_verified')),
+        'page': record.get('page') or None,
+        'first_seen': _first(record.get('first_seen'), scraped_at),
+        'last_updated': scraped_at,
+        'verified_email': _first(record.get('verified_email'), contact.get('verified_email'), contact.get('email_verified')),
+        'verified_mobile': _first(record.get('verified_mobile'), contact.get('verified_mobile'), contact.get('mobile_verified')),
+        'dob': _first(record.get('dob'), contact.get('dob'), contact.get('date_of_birth')),
+        'city': _first(record.get('city'), contact.get('city')),
+        'county': _first(record.get('county'), contact.get('county')),
+        'total_orders': len(orders) or int(record.get('total_orders') or 0),
+        'has_loyalty': bool(record.get('has_loyalty')) or _has_content(record.get('loyalty')),
+        'has_coupons': bool(record.get('has_coupons')) or _has_content(record.get('coupons')),
+        'orders': orders,
+    }
+
+
+def write_customer_batch(conn: sqlite3.Connection, customers: List[Dict],
+                         upsert_sql: str = UPSERT_CUSTOMER_SQL) -> int:
+    """Upsert a batch of normalized customers and their orders in one transaction"""
+    if not customers:
+        return 0
+
+    cursor = conn.cursor()
+    cursor.executemany(
+        upsert_sql,
+        [tuple(customer[field] for field in CUSTOMER_FIELDS) for customer in customers]
+    )
+
+    with_orders = [c for c in customers if c['orders']]
+    order_count = 0
+    if with_orders:
+        ids = {}
+        emails = [c['email'] for c in with_orders]
+        for i in range(0, len(emails), 500):
+            chunk = emails[i:i + 500]
+            cursor.execute(
+                f"SELECT email, id FROM customers WHERE email IN ({','.join('?' for _ in chunk)})",
+                chunk
+            )
+            ids.update(cursor.fetchall())
+
+        rows = []
+        for customer in with_orders:
+            rows.extend(order_rows(ids[customer['email']], customer['orders']))
+        if rows:
+            cursor.executemany(UPSERT_ORDER_SQL, rows)
+        order_count = len(rows)
+
+    conn.commit()
+    return order_count
+
+
+def import_records(conn: sqlite3.Connection, records: Iterable[Dict],
+                   batch_size: int = IMPORT_BATCH_SIZE, stats: Optional[Dict] = None) -> Dict:
+    """Stream records into the database, committing every batch_size rows
+
+    Counts go into `stats` as they are committed, so a caller passing its
+    own dict still sees the rows imported before a parse error.
+    """
+    if stats is None:
+        stats = {'rows': 0, 'orders': 0, 'skipped': 0}
+    batch = []
+
+    def flush():
+        stats['orders'] += write_customer_batch(conn, batch)
+        stats['rows'] += len(batch)
+        batch.clear()
+
+    records = iter(records)
+    while True:
+        try:
+            record = next(records)
+        except StopIteration:
+            break
+        except ValueError:
+            # Keep everything parsed before a corrupt or truncated file's bad tail
+            flush()
+            raise
+        customer = normalize_customer(record)
+        if not customer:
+            stats['skipped'] += 1
+            continue
+        batch.append(customer)
+        if len(batch) >= batch_size:
+            flush()
+
+    flush()
+    return stats
+
+
+def import_json_files(db_path: str, paths: List[str], batch_size: int = IMPORT_BATCH_SIZE) -> Dict:
+    """Import legacy JSON files into the database and report throughput"""
+    migrate(db_path)
+    conn = connect(db_path)
+    # Batched commits in WAL mode do not need a full fsync each
+    conn.execute("PRAGMA synchronous = NORMAL")
+
+    totals = {'files': 0, 'rows': 0, 'orders': 0, 'skipped': 0, 'seconds': 0.0}
+
+    try:
+        for path in paths:
+            start_time = time.time()
+            stats = {'rows': 0, 'orders': 0, 'skipped': 0}
+            try:
+                import_records(conn, iter_records(path), batch_size, stats)
+            except (OSError, ValueError) as e:
+                # Rows committed before the error stay imported and counted
+                print(f"❌ {path}: {e} (after {stats['rows']} customers)")
+            else:
+                totals['files'] += 1
+                elapsed = time.time() - start_time
+                rate = stats['rows'] / elapsed if elapsed > 0 else 0
+                print(f"📥 {path}: {stats['rows']} customers, {stats['orders']} orders "
+                      f"in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+
+            totals['seconds'] += time.time() - start_time
+            for key in ('rows', 'orders', 'skipped'):
+                totals[key] += stats[key]
+    finally:
+        conn.close()
+
+    totals['rows_per_sec'] = totals['rows'] / totals['seconds'] if totals['seconds'] > 0 else 0
+    return totals
+
+
+def find_legacy_files(patterns: List[str] = LEGACY_PATTERNS) -> List[str]:
+    """Legacy files oldest first, so newer dumps are applied last"""
+    paths = set()
+    for pattern in patterns:
+        paths.update(glob.glob(pattern))
+    return with_journals(sorted(paths, key=os.path.getmtime))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import legacy customer JSON dumps into SQLite")
+    parser.add_argument("files", nargs="*", help="JSON files to import (default: all legacy dumps)")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database path")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    paths = with_journals(args.files) if args.files else find_legacy_files()
+    if not paths:
+        print("ℹ️ No legacy JSON files found")
+        sys.exit(0)
+
+    totals = import_json_files(args.db, paths, args.batch_size)
+    print(f"✅ Imported {totals['rows']} customers and {totals['orders']} orders "
+          f"from {totals['files']} files ({totals['rows_per_sec']:,.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
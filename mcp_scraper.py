@@ -7,6 +7,7 @@ Uses the same Playwright MCP session that's already logged in
 import json
 import os
 from datetime import datetime
+from customer_journal import CustomerJournal, record_email
 
 class MCPCustomerScraper:
     def __init__(self):
@@ -14,44 +15,39 @@ class MCPCustomerScraper:
         self.scraped_emails = set()
         self.output_dir = "customer_data"
         os.makedirs(self.output_dir, exist_ok=True)
+        self.journal = CustomerJournal(f"{self.output_dir}/customers_mcp.json")
+        self.saved_count = 0
         
         # Load existing data
         self.load_existing_data()
         
     def load_existing_data(self):
         try:
-            if os.path.exists(f"{self.output_dir}/customers_mcp.json"):
-                with open(f"{self.output_dir}/customers_mcp.json", 'r') as f:
-                    self.customers_data = json.load(f)
-                    self.scraped_emails = {c.get('email', '').lower() for c in self.customers_data}
-                    print(f"📚 Loaded {len(self.customers_data)} existing customers")
+            self.customers_data = self.journal.load()
+            self.scraped_emails = {record_email(c) for c in self.customers_data}
+            self.saved_count = len(self.customers_data)
+            if self.customers_data:
+                print(f"📚 Loaded {len(self.customers_data)} existing customers")
         except Exception as e:
             print(f"Error loading: {e}")
     
     def save_data(self):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        # Save main JSON
-        json_file = f"{self.output_dir}/customers_mcp.json"
-        with open(json_file, 'w') as f:
-            json.dump(self.customers_data, f, indent=2)
-        
-        # Save timestamped backup
-        backup_file = f"{self.output_dir}/backup_customers_{timestamp}.json"
-        with open(backup_file, 'w') as f:
-            json.dump(self.customers_data, f, indent=2)
-        
-        print(f"💾 Saved {len(self.customers_data)} customers to {json_file}")
+        # Append customers added since the last save to the journal
+        new_customers = self.customers_data[self.saved_count:]
+        self.journal.append(new_customers)
+        self.journal.sync()
+        self.saved_count = len(self.customers_data)
         
-        # Create simple CSV
+        print(f"💾 Saved {len(self.customers_data)} customers (+{len(new_customers)} journaled to {self.journal.journal_path})")
+    
+    def export_csv(self):
+        """Export the journaled customers as a timestamped CSV (on demand)"""
+        self.journal.sync()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         csv_file = f"{self.output_dir}/customers_simple_{timestamp}.csv"
-        with open(csv_file, 'w') as f:
-            f.write("FirstName,LastName,Email,Mobile,Address,Postcode,DOB,City,County,TotalOrders\n")
-            for c in self.customers_data:
-                contact = c.get('contact_details', {})
-                f.write(f'"{c.get("first_name","")}","{c.get("last_name","")}","{c.get("email","")}","{c.get("mobile","")}","{c.get("address","")}","{c.get("postcode","")}","{contact.get("dob","")}","{contact.get("city","")}","{contact.get("county","")}",{len(c.get("orders",[]))}\n')
-        
-        print(f"📊 CSV exported: {csv_file}")
+        count = self.journal.export_csv(csv_file)
+        print(f"📊 CSV exported: {csv_file} ({count} customers)")
+        return csv_file
 
 # Global scraper instance
 scraper = MCPCustomerScraper()
@@ -82,6 +78,8 @@ print("🚀 MCP Customer Scraper Ready!")
 print("📋 Instructions:")
 print("1. Make sure you're on the customer page")
 print("2. Run: scraper.save_data() to save progress anytime")
+print("   scraper.journal.compact() folds the journal into customers_mcp.json")
+print("   scraper.export_csv() writes a customers_simple_<timestamp>.csv")
 print("3. Use: extract_customer_from_row_data(row_text) for quick extraction")
 print(f"📊 Current database: {len(scraper.customers_data)} customers")
 
@@ -89,5 +87,6 @@ print(f"📊 Current database: {len(scraper.customers_data)} customers")
 if __name__ == "__main__":
     print("\n🎯 Interactive Mode - You can now use:")
     print("   scraper.save_data() - Save current data")
+    print("   scraper.export_csv() - Export current data as CSV")
     print("   scraper.customers_data - View all data")
     print("   extract_customer_from_row_data(text) - Extract from row")
\ No newline at end of file
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Prometheus text exposition for the dashboard's /metrics endpoint
+In-process counters/histograms for request and query latency, plus scan,
+database and customer metrics derived from the monitor's tables - no client
+library needed for the handful of series we publish.
+"""
+
+import os
+import sqlite3
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets (seconds) for dashboard requests and database queries
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Scan and scan phase duration buckets (seconds)
+SCAN_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    """{a="x",b="y"} with Prometheus string escaping (empty for no labels)"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def metric_lines(name: str, kind: str, help_text: str,
+                 samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    """HELP/TYPE header plus one line per (labels, value) sample"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{format_labels(labels)} {format_value(value)}" for labels, value in samples)
+    return lines
+
+
+class Counter:
+    """Monotonic counter with labels, safe to bump from any thread"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            samples = [(dict(key), value) for key, value in sorted(self._values.items())]
+        return metric_lines(self.name, "counter", self.help_text, samples)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, safe to observe from any thread"""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (non-cumulative) ..., +Inf count, sum]
+        self._series: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        slot = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[slot] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(dict(key), list(values)) for key, values in sorted(self._series.items())]
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(values[-1])}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+
+def _epoch(timestamp: Optional[str]) -> Optional[float]:
+    """Seconds since the epoch for the monitor's local ISO timestamps"""
+    if not timestamp:
+        return None
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except ValueError:
+        return None
+
+
+class ScanMetrics:
+    """Scan counts, totals and duration histograms from monitoring_log/scan_phases
+
+    Both tables are append-only, so each collect() folds in only the rows
+    added since the last one (an id watermark) instead of rescanning the
+    history on every scrape. Rows pruned later stay counted, as counters
+    should; a database whose ids went backwards (restored or replaced) is
+    reread from scratch, which Prometheus sees as a counter reset.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.last_log_id = 0
+        self.last_phase_id = 0
+        # action -> [scans, customers found, new customers, errors]
+        self.totals: Dict[str, List[int]] = {}
+        self.durations = Histogram("keatchen_scan_duration_seconds", "Scan execution time", SCAN_BUCKETS)
+        self.phases = Histogram("keatchen_scan_phase_duration_seconds", "Time spent per scan phase", SCAN_BUCKETS)
+
+    def _update(self, conn: sqlite3.Connection):
+        head = conn.execute("SELECT COALESCE(MAX(id), 0) FROM monitoring_log").fetchone()[0]
+        phase_head = conn.execute("SELECT COALESCE(MAX(id), 0) FROM scan_phases").fetchone()[0]
+        if head < self.last_log_id or phase_head < self.last_phase_id:
+            self._reset()
+
+        for log_id, action, found, new, errors, seconds in conn.execute('''
+            SELECT id, action, customers_found, new_customers, errors, execution_time
+            FROM monitoring_log WHERE id > ? AND id <= ? ORDER BY id
+        ''', (self.last_log_id, head)):
+            totals = self.totals.setdefault(action, [0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += found or 0
+            totals[2] += new or 0
+            totals[3] += errors or 0
+            if seconds is not None:
+                self.durations.observe(seconds, action=action)
+        self.last_log_id = head
+
+        for phase, seconds in conn.execute(
+            "SELECT phase, seconds FROM scan_phases WHERE id > ? AND id <= ?", (self.last_phase_id, phase_head)
+        ):
+            self.phases.observe(seconds, phase=phase)
+        self.last_phase_id = phase_head
+
+    def collect(self, conn: sqlite3.Connection) -> List[str]:
+        with self._lock:
+            self._update(conn)
+            totals = sorted(self.totals.items(), key=lambda item: str(item[0]))
+            lines = metric_lines("keatchen_scans_total", "counter", "Scans logged in monitoring_log",
+                                 [({"action": a}, t[0]) for a, t in totals])
+            lines += metric_lines("keatchen_scan_customers_found_total", "counter", "Customer rows seen by scans",
+                                  [({"action": a}, t[1]) for a, t in totals])
+            lines += metric_lines("keatchen_scan_new_customers_total", "counter", "New customers detected by scans",
+                                  [({"action": a}, t[2]) for a, t in totals])
+            lines += metric_lines("keatchen_scan_errors_total", "counter", "Errors reported by scans",
+                                  [({"action": a}, t[3]) for a, t in totals])
+            lines += self.durations.render()
+            lines += self.phases.render()
+
+        last = conn.execute('''
+            SELECT timestamp, customers_found, new_customers, errors, execution_time
+            FROM monitoring_log ORDER BY id DESC LIMIT 1
+        ''').fetchone()
+        if last:
+            timestamp, found, new, errors, seconds = last
+            lines += metric_lines("keatchen_last_scan_timestamp_seconds", "gauge", "When the latest scan was logged",
+                                  [({}, _epoch(timestamp) or 0)])
+            lines += metric_lines("keatchen_last_scan_customers_found", "gauge", "Customers seen by the latest scan",
+                                  [({}, found or 0)])
+            lines += metric_lines("keatchen_last_scan_new_customers", "gauge", "New customers in the latest scan",
+                                  [({}, new or 0)])
+            lines += metric_lines("keatchen_last_scan_errors", "gauge", "Errors in the latest scan",
+                                  [({}, errors or 0)])
+            lines += metric_lines("keatchen_last_scan_duration_seconds", "gauge", "Duration of the latest scan",
+                                  [({}, seconds or 0)])
+        return lines
+
+
+def collect_customer_metrics(conn: sqlite3.Connection) -> List[str]:
+    """Customer totals from the trigger-maintained stats table"""
+    counters = dict(conn.execute("SELECT key, value FROM stats").fetchall())
+    return metric_lines("keatchen_customers", "gauge", "Customers in the database", [
+        ({"state": "all"}, counters.get("customers", 0)),
+        ({"state": "active"}, counters.get("active_customers", 0)),
+    ])
+
+
+def collect_db_metrics(conn: sqlite3.Connection, db_path: str) -> List[str]:
+    """File sizes and page usage of the SQLite database"""
+    def size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    lines = metric_lines("keatchen_db_size_bytes", "gauge", "Size of the database file", [({}, size(db_path))])
+    lines += metric_lines("keatchen_db_wal_size_bytes", "gauge", "Size of the write-ahead log",
+                          [({}, size(db_path + "-wal"))])
+    lines += metric_lines("keatchen_db_freelist_bytes", "gauge", "Unused space inside the database file",
+                          [({}, freelist * page_size)])
+    return lines
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing each request until its response headers are sent
+
+    Measuring to the response start keeps streaming endpoints (exports,
+    server-sent events) from reporting their whole connection lifetime.
+    Requests are labelled by route template, so ids in paths or query
+    strings cannot blow up the series count.
+    """
+
+    def __init__(self, app, latency: Histogram, requests: Counter):
+        self.app = app
+        self.latency = latency
+        self.requests = requests
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        state = {"status": None}
+
+        def record(status: int):
+            route = scope.get("route")
+            labels = {"route": getattr(route, "path", "unmatched"), "method": scope["method"]}
+            self.latency.observe(time.perf_counter() - start, **labels)
+            self.requests.inc(status=str(status), **labels)
+
+        async def send_and_time(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_time)
+        except Exception:
+            if state["status"] is None:
+                record(500)
+            raise
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Gap-repair planner for partial extractions
+Compares the admin panel's reported totals with per-page counts in the
+database and the latest extraction_log outcome per page, and works out
+exactly which pages are missing or short so only those get rescanned.
+"""
+
+import os
+import re
+import math
+import sqlite3
+import argparse
+from datetime import datetime
+from typing import Dict, Optional
+
+from db_migrations import DEFAULT_DB_PATH, connect, migrate
+
+# Rows per page in the admin panel's customer list
+PANEL_PAGE_SIZE = int(os.getenv("PANEL_PAGE_SIZE", "20"))
+
+# Grid pages assumed when the pagination dropdown cannot be read
+DEFAULT_PAGE_COUNT = 27
+
+_OF_TOTAL = re.compile(r'\bof\s+(\d+)\b')
+
+
+def read_page_count(page) -> int:
+    """Number of customer pages, read from the pagination dropdown"""
+    values = []
+    for option in page.query_selector_all('select:first-of-type option'):
+        value = (option.get_attribute('value') or '').strip()
+        if value.isdigit():
+            values.append(int(value))
+    return max(values) if values else DEFAULT_PAGE_COUNT
+
+
+def log_page_result(db_path: str, page_num: int, customers_found: int, success: bool,
+                    error_msg: Optional[str] = None):
+    """Record a page outcome in extraction_log, the ledger page_ledger() reads back"""
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        INSERT INTO extraction_log (timestamp, page, customers_found, success, error_message)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (datetime.now().isoformat(), page_num, customers_found, success, error_msg))
+    conn.commit()
+    conn.close()
+
+
+def parse_reported_total(text: str, total_pages: int) -> Optional[int]:
+    """Customer total from pagination text like '1 - 20 of 538'
+
+    The same text also carries the page count ('of 27'), so the largest
+    'of N' bigger than the page count is taken as the customer total.
+    """
+    values = [int(v) for v in _OF_TOTAL.findall(text or '')]
+    candidates = [v for v in values if v > total_pages]
+    return max(candidates) if candidates else None
+
+
+def expected_page_counts(total_pages: int, total_customers: Optional[int] = None,
+                         page_size: int = PANEL_PAGE_SIZE) -> Dict[int, int]:
+    """Rows the panel should show on each page"""
+    if total_customers:
+        page_size = max(page_size, math.ceil(total_customers / total_pages))
+        last = total_customers - page_size * (total_pages - 1)
+    else:
+        last = page_size
+    counts = {page: page_size for page in range(1, total_pages)}
+    counts[total_pages] = max(last, 0)
+    return counts
+
+
+def page_ledger(conn: sqlite3.Connection) -> Dict[int, Dict]:
+    """Active customers per page plus the latest logged outcome per page"""
+    ledger = {}
+    for page, count in conn.execute('''
+        SELECT page, COUNT(*) FROM customers
+        WHERE is_active = TRUE AND page IS NOT NULL
+        GROUP BY page
+    '''):
+        ledger[page] = {'in_db': count, 'logged': None, 'success': None, 'logged_at': None}
+
+    for page, found, success, logged_at in conn.execute('''
+        SELECT page, customers_found, success, timestamp FROM extraction_log
+        WHERE id IN (SELECT MAX(id) FROM extraction_log GROUP BY page)
+    '''):
+        entry = ledger.setdefault(page, {'in_db': 0})
+        entry.update({'logged': found, 'success': bool(success), 'logged_at': logged_at})
+    return ledger
+
+
+def plan_repair(conn: sqlite3.Connection, total_pages: int,
+                total_customers: Optional[int] = None,
+                page_size: int = PANEL_PAGE_SIZE) -> Dict:
+    """Pages to rescan, each with the reason it was picked"""
+    expected = expected_page_counts(total_pages, total_customers, page_size)
+    ledger = page_ledger(conn)
+
+    pages = []
+    for page in range(1, total_pages + 1):
+        entry = ledger.get(page, {'in_db': 0, 'logged': None, 'success': None})
+        want = expected[page]
+        reasons = []
+        if entry['in_db'] == 0:
+            reasons.append('missing')
+        elif entry['in_db'] < want:
+            reasons.append(f"short {entry['in_db']}/{want}")
+        if entry.get('success') is False:
+            reasons.append('last attempt failed')
+        elif entry.get('logged') is not None and entry['logged'] < want:
+            reasons.append(f"last attempt found {entry['logged']}/{want}")
+        if reasons:
+            pages.append({
+                'page': page,
+                'expected': want,
+                'in_db': entry['in_db'],
+                'reasons': reasons,
+            })
+
+    in_db = conn.execute("SELECT COUNT(*) FROM customers WHERE is_active = TRUE").fetchone()[0]
+    return {
+        'total_pages': total_pages,
+        'reported_total': total_customers,
+        'in_db': in_db,
+        'shortfall': max((total_customers or 0) - in_db, 0),
+        'pages': pages,
+    }
+
+
+def print_plan(plan: Dict):
+    reported = plan['reported_total'] if plan['reported_total'] is not None else 'unknown'
+    print(f"📋 Panel: {reported} customers on {plan['total_pages']} pages | database: {plan['in_db']} active")
+    if not plan['pages']:
+        if plan['shortfall']:
+            # Counts per page look complete, so the gap comes from rows shifting between pages
+            print(f"⚠️ {plan['shortfall']} customers short but every page looks complete - run a full sweep")
+        else:
+            print("✅ Nothing to repair")
+        return
+    print(f"🔧 {len(plan['pages'])} pages to rescan:")
+    for entry in plan['pages']:
+        print(f"   page {entry['page']:>3}: {', '.join(entry['reasons'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan a targeted rescan of missing or short pages")
+    parser.add_argument("--pages", type=int, required=True, help="page count shown by the panel")
+    parser.add_argument("--total", type=int, help="customer total shown by the panel")
+    parser.add_argument("--page-size", type=int, default=PANEL_PAGE_SIZE)
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database path")
+    args = parser.parse_args()
+
+    migrate(args.db)
+    conn = connect(args.db)
+    try:
+        print_plan(plan_repair(conn, args.pages, args.total, args.page_size))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
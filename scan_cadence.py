@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Adaptive hot-scan interval from observed sign-up arrival rates
+Models new-customer arrivals per hour of the week from new_customers_today
+and spreads scans so the average sign-up is detected within a target
+latency: frequent scans in the Friday dinner rush, rare ones at 4 a.m.
+"""
+
+import math
+import sqlite3
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from db_migrations import DEFAULT_DB_PATH, connect, migrate
+
+HOURS_PER_WEEK = 168
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+# A calendar hour with more detections than this is a backfill (first scan
+# of an empty database, catching up after an outage), not sign-ups
+ARRIVAL_BURST_LIMIT = 50
+# Weeks of the overall mean rate blended into every hour of the week, so
+# an hour seen once or twice is not taken at face value
+RATE_PRIOR_WEEKS = 1.0
+
+
+def hour_of_week(when: datetime) -> int:
+    """0 = Monday 00:00-01:00 ... 167 = Sunday 23:00-24:00"""
+    return when.weekday() * 24 + when.hour
+
+
+def arrival_rates(conn: sqlite3.Connection, now: datetime, weeks: float = 8) -> Optional[List[float]]:
+    """Sign-ups per hour for each hour of the week (None without history)"""
+    rows = conn.execute('''
+        SELECT substr(replace(detected_at, ' ', 'T'), 1, 13) AS hour, COUNT(*)
+        FROM new_customers_today
+        WHERE detected_at >= ?
+        GROUP BY hour
+    ''', ((now - timedelta(weeks=weeks)).isoformat(),)).fetchall()
+
+    counts = [0.0] * HOURS_PER_WEEK
+    first = None
+    for hour, arrivals in rows:
+        try:
+            start = datetime.fromisoformat(hour + ":00")
+        except ValueError:
+            continue
+        first = start if first is None or start < first else first
+        if arrivals <= ARRIVAL_BURST_LIMIT:
+            counts[hour_of_week(start)] += arrivals
+    if first is None:
+        return None
+
+    # How often each hour of the week has been observed since the first arrival
+    exposure = [0.0] * HOURS_PER_WEEK
+    hour = first
+    while hour <= now:
+        exposure[hour_of_week(hour)] += 1
+        hour += timedelta(hours=1)
+
+    # Smooth over neighbouring hours, then shrink towards the overall mean
+    def smooth(values: List[float]) -> List[float]:
+        n = len(values)
+        return [(values[h - 1] + 2 * values[h] + values[(h + 1) % n]) / 4 for h in range(n)]
+
+    counts, exposure = smooth(counts), smooth(exposure)
+    mean = sum(counts) / max(sum(exposure), 1)
+    return [(c + RATE_PRIOR_WEEKS * mean) / (e + RATE_PRIOR_WEEKS) for c, e in zip(counts, exposure)]
+
+
+def plan_intervals(rates: List[float], target_latency: float,
+                   min_interval: float, max_interval: float) -> List[float]:
+    """Scan interval (seconds) for each hour of the week
+
+    A sign-up waits half an interval on average, so the arrival-weighted
+    mean latency is sum(rate * T / 2) / sum(rate). Holding that at the
+    target with the fewest scans gives T proportional to 1/sqrt(rate)
+    (the square-root rule); the scale is found by bisection because the
+    min/max clamp bends the curve. Hours with no sign-ups get max_interval.
+    """
+    total = sum(rates)
+    if total <= 0:
+        return [max_interval] * len(rates)
+
+    def intervals(scale: float) -> List[float]:
+        return [min(max(scale / math.sqrt(r), min_interval), max_interval) if r > 0 else max_interval
+                for r in rates]
+
+    def latency(scale: float) -> float:
+        return sum(r * t / 2 for r, t in zip(rates, intervals(scale))) / total
+
+    low, high = 0.0, max_interval * math.sqrt(max(rates))
+    for _ in range(60):
+        mid = (low + high) / 2
+        if latency(mid) > target_latency:
+            high = mid
+        else:
+            low = mid
+    return intervals(low)
+
+
+def expected_latency(rates: List[float], intervals: List[float]) -> float:
+    """Arrival-weighted mean detection latency (seconds) of a plan"""
+    total = sum(rates)
+    return sum(r * t / 2 for r, t in zip(rates, intervals)) / total if total else 0.0
+
+
+def scans_per_week(intervals: List[float]) -> float:
+    return sum(3600 / t for t in intervals)
+
+
+class AdaptiveInterval:
+    """Job(every=...) callable: seconds from a slot to the next hot scan
+
+    Rates are re-read from the database at most every `refresh` seconds;
+    until there is any sign-up history the fixed `fallback` interval is used.
+    """
+
+    def __init__(self, db_path: str, target_latency: float, min_interval: float, max_interval: float,
+                 fallback: float, weeks: float = 8, refresh: float = 3600):
+        self.db_path = db_path
+        self.target_latency = target_latency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.fallback = fallback
+        self.weeks = weeks
+        self.refresh = refresh
+        self.intervals: Optional[List[float]] = None
+        self._loaded_at: Optional[float] = None
+
+    def plan(self, now: datetime) -> Optional[List[float]]:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh:
+            conn = connect(self.db_path)
+            try:
+                rates = arrival_rates(conn, now, self.weeks)
+            finally:
+                conn.close()
+            self.intervals = None if rates is None else plan_intervals(
+                rates, self.target_latency, self.min_interval, self.max_interval)
+            self._loaded_at = time.monotonic()
+        return self.intervals
+
+    def __call__(self, after: datetime) -> float:
+        intervals = self.plan(after)
+        if not intervals:
+            return self.fallback
+
+        # Never sleep through the start of a busier hour: each hour boundary
+        # inside the interval may pull the next scan earlier
+        interval = intervals[hour_of_week(after)]
+        boundary = after.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        while boundary < after + timedelta(seconds=interval):
+            interval = min(interval, (boundary - after).total_seconds() + intervals[hour_of_week(boundary)])
+            boundary += timedelta(hours=1)
+        return interval
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the adaptive hot-scan plan for each hour of the week")
+    parser.add_argument("--target", type=float, default=300, help="target mean detection latency (seconds)")
+    parser.add_argument("--min", type=float, default=300, help="shortest interval (seconds)")
+    parser.add_argument("--max", type=float, default=3600, help="longest interval (seconds)")
+    parser.add_argument("--weeks", type=float, default=8, help="weeks of sign-up history to model")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database path")
+    args = parser.parse_args()
+
+    migrate(args.db)
+    conn = connect(args.db)
+    try:
+        rates = arrival_rates(conn, datetime.now(), args.weeks)
+    finally:
+        conn.close()
+    if rates is None:
+        print("ℹ️ No sign-up history yet - the fixed HOT_SCAN_INTERVAL_SECONDS is used")
+        return
+
+    intervals = plan_intervals(rates, args.target, args.min, args.max)
+    print(f"🗓️ Hot-scan interval (minutes) per hour, from {sum(rates):.1f} sign-ups/week")
+    print("     " + "".join(f"{h:>4}" for h in range(24)))
+    for day, name in enumerate(DAY_NAMES):
+        print(f"{name}  " + "".join(f"{intervals[day * 24 + h] / 60:>4.0f}" for h in range(24)))
+    print(f"📈 {scans_per_week(intervals):.0f} scans/week, mean detection latency "
+          f"{expected_latency(rates, intervals) / 60:.1f} min "
+          f"(fixed {args.target * 2 / 60:.0f} min interval: {scans_per_week([args.target * 2] * HOURS_PER_WEEK):.0f} scans/week)")
+
+
+if __name__ == "__main__":
+    main()
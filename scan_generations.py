@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Mark-and-sweep deactivation for full customer scans
+Every full sweep gets a generation number and stamps the customers it sees;
+only a sweep in which every page succeeded may deactivate the rows it did
+not see, in a single set-based UPDATE.
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from db_migrations import connect
+
+# Refuse to deactivate more than this share of the active customers in one
+# sweep - a panel glitch that hides rows should not wipe the active set
+SWEEP_MAX_DEACTIVATE_FRACTION = float(os.getenv("SWEEP_MAX_DEACTIVATE_FRACTION", "0.2"))
+
+# Value for customers.last_seen_generation in a writer's INSERT: customers
+# added while a sweep runs count as seen by it
+RUNNING_GENERATION_SQL = "(SELECT MAX(generation) FROM scan_generations WHERE status = 'running')"
+
+
+def start_generation(conn: sqlite3.Connection, source: str, pages_expected: int) -> int:
+    """Insert a running sweep on an open connection (caller commits)
+
+    The sweep only ever deactivates customers that exist now (ids up to
+    max_customer_id); rows other writers add meanwhile are never swept.
+    """
+    cursor = conn.execute('''
+        INSERT INTO scan_generations (source, started_at, pages_expected, status, max_customer_id)
+        VALUES (?, ?, ?, 'running', (SELECT COALESCE(MAX(id), 0) FROM customers))
+    ''', (source, datetime.now().isoformat(), pages_expected))
+    return cursor.lastrowid
+
+
+def begin_sweep(db_path: str, source: str, pages_expected: int) -> int:
+    """Register a new full sweep and return its generation number"""
+    conn = sqlite3.connect(db_path)
+    try:
+        generation = start_generation(conn, source, pages_expected)
+        conn.commit()
+        return generation
+    finally:
+        conn.close()
+
+
+def mark_seen(db_path: str, generation: int, emails: Iterable[str], page: Optional[int] = None) -> int:
+    """Stamp the customers seen on one page (one UPDATE, lower(email) index)
+
+    With `page`, their grid page is brought up to date as well, so page
+    based work (repair planning, detail refreshes) finds them where they are.
+    """
+    keys = sorted({email.lower() for email in emails if email})
+    if not keys:
+        return 0
+
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute(f'''
+            UPDATE customers SET last_seen_generation = ?, is_active = TRUE, page = COALESCE(?, page)
+            WHERE lower(email) IN ({','.join('?' for _ in keys)})
+        ''', [generation, page] + keys)
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def finish_sweep(db_path: str, generation: int, pages_ok: int,
+                 max_fraction: float = SWEEP_MAX_DEACTIVATE_FRACTION) -> Dict:
+    """Close a sweep; deactivate unseen customers only if it was complete"""
+    conn = connect(db_path)
+    conn.isolation_level = None
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        pages_expected, max_id = conn.execute(
+            "SELECT pages_expected, max_customer_id FROM scan_generations WHERE generation = ?", (generation,)
+        ).fetchone()
+        seen = conn.execute(
+            "SELECT COUNT(*) FROM customers WHERE last_seen_generation = ?", (generation,)
+        ).fetchone()[0]
+        active, unseen = conn.execute('''
+            SELECT COUNT(*),
+                   COALESCE(SUM(last_seen_generation IS NULL OR last_seen_generation < ?), 0)
+            FROM customers WHERE is_active = TRUE AND id <= COALESCE(?, id)
+        ''', (generation, max_id)).fetchone()
+
+        deactivated = 0
+        if pages_ok < pages_expected:
+            status = 'partial'
+        elif active and unseen > active * max_fraction:
+            status = 'aborted'
+        else:
+            deactivated = conn.execute('''
+                UPDATE customers SET is_active = FALSE
+                WHERE is_active = TRUE AND id <= COALESCE(?, id)
+                AND (last_seen_generation IS NULL OR last_seen_generation < ?)
+            ''', (max_id, generation)).rowcount
+            status = 'swept'
+
+        conn.execute('''
+            UPDATE scan_generations
+            SET finished_at = ?, pages_ok = ?, rows_seen = ?, deactivated = ?, status = ?
+            WHERE generation = ?
+        ''', (datetime.now().isoformat(), pages_ok, seen, deactivated, status, generation))
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    return {
+        'generation': generation,
+        'status': status,
+        'pages_ok': pages_ok,
+        'pages_expected': pages_expected,
+        'seen': seen,
+        'unseen': unseen,
+        'deactivated': deactivated,
+    }
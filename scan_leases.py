@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Lease-based work sharing for multi-node scans
+A scan tier's pages are split into page-range leases in the shared
+database. A worker claims a range with an expiry and checkpoints every
+page under the fencing token it was given, which also renews the lease;
+a crashed worker's range expires and is reclaimed from the next unscanned
+page, while the old holder's late checkpoints are refused. Whichever
+worker finds no ranges left open closes the batch (and its sweep).
+"""
+
+import os
+import socket
+import sqlite3
+import argparse
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from db_migrations import DEFAULT_DB_PATH, connect, migrate
+from scan_generations import start_generation
+
+# A lease not renewed (checkpointed) for this long is free to reclaim
+LEASE_SECONDS = float(os.getenv("SCAN_LEASE_SECONDS", "300"))
+# Pages per lease - smaller ranges spread a sweep more evenly over nodes
+SHARD_PAGES = int(os.getenv("SCAN_SHARD_PAGES", "3"))
+# Claims of one range before it is given up as failed (a page that
+# crashes every worker), leaving the sweep partial
+MAX_LEASE_ATTEMPTS = 3
+# Longest pause between checks while waiting on other nodes' leases
+LEASE_POLL_SECONDS = 15
+
+
+def node_id() -> str:
+    """This worker's name in scan_leases.owner (SCAN_NODE_ID, else host:pid)"""
+    return os.getenv("SCAN_NODE_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+
+def page_ranges(first_page: int, last_page: int, size: int = SHARD_PAGES) -> List[Tuple[int, int]]:
+    return [(start, min(start + size - 1, last_page)) for start in range(first_page, last_page + 1, size)]
+
+
+@contextmanager
+def _immediate(db_path: str) -> Iterator[sqlite3.Connection]:
+    """Write transaction taken up front, so concurrent claims serialize"""
+    conn = connect(db_path)
+    conn.isolation_level = None
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def open_batch(db_path: str, kind: str, ranges: List[Tuple[int, int]], join_window: float,
+               max_age: float, sweep_pages: Optional[int] = None, source: str = 'monitor') -> Dict:
+    """Join this kind's current batch or start a new one
+
+    A batch still running and younger than max_age is joined, as is any
+    batch started within join_window seconds (so nodes firing for the same
+    slot share one batch). A running batch past max_age is abandoned.
+    With sweep_pages a scan generation is registered alongside the batch.
+    """
+    now = datetime.now()
+    with _immediate(db_path) as conn:
+        latest = conn.execute('''
+            SELECT id, generation, created_at, status FROM scan_batches
+            WHERE kind = ? ORDER BY id DESC LIMIT 1
+        ''', (kind,)).fetchone()
+        if latest:
+            batch_id, generation, created_at, status = latest
+            created = datetime.fromisoformat(created_at)
+            if status == 'running' and created < now - timedelta(seconds=max_age):
+                conn.execute("UPDATE scan_batches SET status = 'abandoned', finished_at = ? WHERE id = ?",
+                             (now.isoformat(), batch_id))
+                if generation is not None:
+                    conn.execute('''
+                        UPDATE scan_generations SET status = 'abandoned', finished_at = ?
+                        WHERE generation = ? AND status = 'running'
+                    ''', (now.isoformat(), generation))
+            elif status == 'running' or created >= now - timedelta(seconds=join_window):
+                return {'id': batch_id, 'generation': generation, 'status': status, 'joined': True}
+
+        generation = start_generation(conn, source, sweep_pages) if sweep_pages is not None else None
+        batch_id = conn.execute('''
+            INSERT INTO scan_batches (kind, generation, created_at, created_by) VALUES (?, ?, ?, ?)
+        ''', (kind, generation, now.isoformat(), node_id())).lastrowid
+        conn.executemany('''
+            INSERT INTO scan_leases (batch_id, first_page, last_page, next_page) VALUES (?, ?, ?, ?)
+        ''', [(batch_id, first, last, first) for first, last in ranges])
+        return {'id': batch_id, 'generation': generation, 'status': 'running', 'joined': False}
+
+
+def claim_lease(db_path: str, batch_id: int, owner: str, lease_seconds: float = LEASE_SECONDS) -> Optional[Dict]:
+    """Claim the next pending or expired range of a batch (None when nothing is claimable)"""
+    now = time.time()
+    with _immediate(db_path) as conn:
+        # Ranges that used up their attempts are closed rather than retried
+        conn.execute('''
+            UPDATE scan_leases SET status = 'failed', finished_at = ?
+            WHERE batch_id = ? AND status = 'leased' AND expires_at < ? AND attempts >= ?
+        ''', (datetime.now().isoformat(), batch_id, now, MAX_LEASE_ATTEMPTS))
+        row = conn.execute('''
+            SELECT id, first_page, last_page, next_page, fence FROM scan_leases
+            WHERE batch_id = ? AND (status = 'pending' OR (status = 'leased' AND expires_at < ?))
+            ORDER BY first_page LIMIT 1
+        ''', (batch_id, now)).fetchone()
+        if row is None:
+            return None
+        lease_id, first_page, last_page, next_page, fence = row
+        conn.execute('''
+            UPDATE scan_leases SET status = 'leased', owner = ?, expires_at = ?, fence = fence + 1,
+                                   attempts = attempts + 1
+            WHERE id = ?
+        ''', (owner, now + lease_seconds, lease_id))
+    return {'id': lease_id, 'batch_id': batch_id, 'first_page': first_page, 'last_page': last_page,
+            'next_page': next_page, 'fence': fence + 1}
+
+
+def checkpoint(db_path: str, lease: Dict, page_ok: bool, lease_seconds: float = LEASE_SECONDS) -> str:
+    """Record lease['next_page'] as scanned and renew the lease
+
+    Returns 'lost' if the lease was reclaimed meanwhile (stop working on
+    it), 'done' when that was the range's last page and 'ok' otherwise.
+    """
+    with _immediate(db_path) as conn:
+        updated = conn.execute('''
+            UPDATE scan_leases SET next_page = next_page + 1, pages_ok = pages_ok + ?, expires_at = ?,
+                   status = CASE WHEN next_page >= last_page THEN 'done' ELSE status END,
+                   finished_at = CASE WHEN next_page >= last_page THEN ? ELSE finished_at END
+            WHERE id = ? AND fence = ? AND status = 'leased' AND next_page = ?
+        ''', (int(page_ok), time.time() + lease_seconds, datetime.now().isoformat(),
+              lease['id'], lease['fence'], lease['next_page'])).rowcount
+        if not updated:
+            return 'lost'
+    lease['next_page'] += 1
+    return 'ok' if lease['next_page'] <= lease['last_page'] else 'done'
+
+
+def release_lease(db_path: str, lease: Dict):
+    """Hand an unfinished range back (out of time) so another worker resumes it"""
+    with _immediate(db_path) as conn:
+        conn.execute('''
+            UPDATE scan_leases SET status = 'pending', owner = NULL, expires_at = NULL
+            WHERE id = ? AND fence = ? AND status = 'leased'
+        ''', (lease['id'], lease['fence']))
+
+
+def close_batch(db_path: str, batch_id: int) -> Optional[Dict]:
+    """Close a batch with no open ranges left
+
+    Every worker calls this when it runs out of ranges; exactly one of
+    them gets the page totals back (and finishes the sweep), the rest None.
+    """
+    with _immediate(db_path) as conn:
+        open_ranges = conn.execute('''
+            SELECT COUNT(*) FROM scan_leases WHERE batch_id = ? AND status IN ('pending', 'leased')
+        ''', (batch_id,)).fetchone()[0]
+        if open_ranges or not conn.execute('''
+            UPDATE scan_batches SET status = 'done', finished_at = ? WHERE id = ? AND status = 'running'
+        ''', (datetime.now().isoformat(), batch_id)).rowcount:
+            return None
+        pages, pages_ok = conn.execute('''
+            SELECT COALESCE(SUM(last_page - first_page + 1), 0), COALESCE(SUM(pages_ok), 0)
+            FROM scan_leases WHERE batch_id = ?
+        ''', (batch_id,)).fetchone()
+    return {'pages': pages, 'pages_ok': pages_ok}
+
+
+def open_ranges(db_path: str, batch_id: int) -> Tuple[int, Optional[float]]:
+    """Ranges of a batch not finished yet, and the earliest lease expiry among them"""
+    conn = connect(db_path)
+    try:
+        count, expires_at = conn.execute('''
+            SELECT COUNT(*), MIN(expires_at) FROM scan_leases
+            WHERE batch_id = ? AND status IN ('pending', 'leased')
+        ''', (batch_id,)).fetchone()
+        return count, expires_at
+    finally:
+        conn.close()
+
+
+def leases(db_path: str, batch_id: int, owner: str, deadline: Optional[float] = None,
+           wait: bool = True) -> Iterator[Dict]:
+    """Yield ranges of a batch for this worker until none are left
+
+    With wait, a worker that runs out of claimable ranges stays until the
+    other nodes' leases finish or expire - so a crashed node's range is
+    reclaimed within the sweep - as long as its deadline allows.
+    """
+    while deadline is None or time.monotonic() < deadline:
+        lease = claim_lease(db_path, batch_id, owner)
+        if lease is not None:
+            yield lease
+            continue
+
+        held, expires_at = open_ranges(db_path, batch_id)
+        if not held or not wait:
+            return
+        pause = LEASE_POLL_SECONDS if expires_at is None else max(expires_at - time.time(), 0) + 1
+        if deadline is not None:
+            pause = min(pause, deadline - time.monotonic())
+        time.sleep(max(min(pause, LEASE_POLL_SECONDS), 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show scan batches and their page-range leases")
+    parser.add_argument("--batches", type=int, default=5, help="number of recent batches to show")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite database path")
+    args = parser.parse_args()
+
+    migrate(args.db)
+    conn = connect(args.db)
+    try:
+        batches = conn.execute('''
+            SELECT id, kind, generation, created_at, created_by, status FROM scan_batches
+            ORDER BY id DESC LIMIT ?
+        ''', (args.batches,)).fetchall()
+        if not batches:
+            print("ℹ️ No scan batches yet")
+            return
+        now = time.time()
+        for batch_id, kind, generation, created_at, created_by, status in batches:
+            sweep = f" (sweep {generation})" if generation else ""
+            print(f"📦 Batch {batch_id} {kind}{sweep} - {status}, started {created_at} by {created_by}")
+            for first, last, next_page, lease_status, owner, expires_at, attempts, pages_ok in conn.execute('''
+                SELECT first_page, last_page, next_page, status, owner, expires_at, attempts, pages_ok
+                FROM scan_leases WHERE batch_id = ? ORDER BY first_page
+            ''', (batch_id,)):
+                holder = f" {owner}, expires in {expires_at - now:.0f}s" if lease_status == 'leased' else ""
+                print(f"   pages {first:>3}-{last:<3} {lease_status:<8} next {next_page:<3} "
+                      f"ok {pages_ok} attempts {attempts}{holder}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
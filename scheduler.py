@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Asyncio job scheduler for the customer monitor
+Runs each job in a worker thread so independent jobs (scan, export) overlap,
+while a job never overlaps itself. Start times carry random jitter, every
+run gets a deadline budget, and missed runs (downtime, overruns) follow a
+per-job catch-up policy using last-run times kept in the database.
+"""
+
+import asyncio
+import logging
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Union
+
+from db_migrations import connect
+
+logger = logging.getLogger(__name__)
+
+# What to do when a slot passed without the job starting in it:
+#   once - run once straight away, then resume the schedule
+#   skip - wait for the next slot
+CATCH_UP_POLICIES = ("once", "skip")
+
+# Upper bound on one scheduler sleep, so wall-clock jumps (suspend, NTP)
+# are noticed within a minute
+MAX_SLEEP_SECONDS = 60
+
+
+class Job:
+    def __init__(self, name: str, fn: Callable, every: Union[float, Callable[[datetime], float], None] = None,
+                 at: Optional[str] = None,
+                 jitter: float = 0, deadline: Optional[float] = None, catch_up: str = "once",
+                 group: Optional[str] = None):
+        """A job runs every `every` seconds or daily `at` 'HH:MM' (local time)
+
+        `every` may be a callable taking a slot time and returning the
+        seconds until the next slot, for intervals that vary over the day.
+        It is called in a worker thread, so it may block (e.g. on the database).
+
+        With a deadline the function is called as fn(deadline=...), a
+        time.monotonic() value it should wrap up by. Jobs sharing a group
+        never run at the same time; a due job waits for the group to free up.
+        """
+        if (every is None) == (at is None):
+            raise ValueError(f"Job {name}: give exactly one of every= or at=")
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"Job {name}: catch_up must be one of {', '.join(CATCH_UP_POLICIES)}")
+        self.name = name
+        self.fn = fn
+        self.every = every
+        self.at = datetime.strptime(at, "%H:%M").time() if at else None
+        self.jitter = jitter
+        self.deadline = deadline
+        self.catch_up = catch_up
+        self.group = group
+
+        self.slot: Optional[datetime] = None  # nominal start time
+        self.due: Optional[datetime] = None   # slot plus jitter
+        self.running = False
+
+    def next_slot(self, after: datetime) -> datetime:
+        """First nominal start time strictly after `after`"""
+        if self.at:
+            slot = datetime.combine(after.date(), self.at)
+            return slot if slot > after else slot + timedelta(days=1)
+        return after + timedelta(seconds=self.every(after) if callable(self.every) else self.every)
+
+    def schedule(self, slot: datetime):
+        self.slot = slot
+        self.due = slot + timedelta(seconds=random.uniform(0, self.jitter)) if self.jitter else slot
+
+
+class Scheduler:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.jobs: List[Job] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._tasks = set()
+
+    def add(self, job: Job) -> Job:
+        self.jobs.append(job)
+        return job
+
+    def _execute(self, sql: str, params: tuple):
+        conn = connect(self.db_path)
+        try:
+            conn.execute(sql, params)
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Could not record job state: {e}")
+        finally:
+            conn.close()
+
+    def _last_started(self) -> Dict[str, datetime]:
+        conn = connect(self.db_path)
+        try:
+            rows = conn.execute("SELECT job, last_started FROM scheduled_jobs WHERE last_started IS NOT NULL")
+            return {job: datetime.fromisoformat(started) for job, started in rows.fetchall()}
+        finally:
+            conn.close()
+
+    def _first_slot(self, job: Job, now: datetime, last_started: Optional[datetime]) -> datetime:
+        """Where a job starts after a (re)start, applying its catch-up policy"""
+        if job.at:
+            previous = job.next_slot(now) - timedelta(days=1)
+            # Never ran: wait for the first slot rather than firing on install
+            missed = previous if last_started is not None and last_started < previous else None
+            upcoming = job.next_slot(now)
+        elif last_started is None:
+            return now
+        else:
+            upcoming = job.next_slot(last_started)
+            missed = upcoming if upcoming <= now else None
+            while upcoming <= now:
+                upcoming = job.next_slot(upcoming)
+
+        if missed is not None:
+            if job.catch_up == "once":
+                logger.info(f"⏪ {job.name}: missed the {missed:%Y-%m-%d %H:%M} run - catching up now")
+                return now
+            logger.info(f"⏭️ {job.name}: missed the {missed:%Y-%m-%d %H:%M} run - waiting for the next slot")
+        return upcoming
+
+    def _next_slot(self, job: Job) -> datetime:
+        """Slot after a finished run; slots that passed meanwhile follow the catch-up policy"""
+        now = datetime.now()
+        upcoming = job.next_slot(job.slot)
+        if upcoming > now:
+            return upcoming
+        if job.catch_up == "once":
+            logger.warning(f"⏱️ {job.name} overran the {upcoming:%H:%M:%S} slot - running again now")
+            return now
+        while upcoming <= now:
+            upcoming = job.next_slot(upcoming)
+        logger.warning(f"⏭️ {job.name} overran - skipping to {upcoming:%Y-%m-%d %H:%M}")
+        return upcoming
+
+    async def _run(self, job: Job):
+        started = datetime.now()
+        clock = time.monotonic()
+        kwargs = {"deadline": clock + job.deadline} if job.deadline else {}
+        await asyncio.to_thread(self._execute, '''
+            INSERT INTO scheduled_jobs (job, last_started, runs) VALUES (?, ?, 1)
+            ON CONFLICT(job) DO UPDATE SET last_started = excluded.last_started, runs = runs + 1
+        ''', (job.name, started.isoformat()))
+
+        status = "ok"
+        try:
+            await asyncio.to_thread(job.fn, **kwargs)
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception as e:
+            status = "error"
+            logger.error(f"❌ Job {job.name} failed: {e}")
+        finally:
+            duration = time.monotonic() - clock
+            if status == "ok" and job.deadline and duration > job.deadline:
+                status = "over_budget"
+                logger.warning(f"⏱️ {job.name} took {duration:.0f}s (budget {job.deadline:.0f}s)")
+            # Callable intervals (AdaptiveInterval) may query the database
+            job.schedule(await asyncio.to_thread(self._next_slot, job))
+            job.running = False
+            await asyncio.to_thread(self._execute, '''
+                UPDATE scheduled_jobs SET last_finished = ?, last_status = ?, last_duration = ?
+                WHERE job = ?
+            ''', (datetime.now().isoformat(), status, duration, job.name))
+            logger.info(f"🗓️ {job.name} next run at {job.due:%Y-%m-%d %H:%M:%S}")
+            self._wake.set()
+
+    async def run(self):
+        """Run the jobs until cancelled"""
+        self._wake = asyncio.Event()
+        last_started = await asyncio.to_thread(self._last_started)
+        now = datetime.now()
+        for job in self.jobs:
+            job.schedule(await asyncio.to_thread(self._first_slot, job, now, last_started.get(job.name)))
+            logger.info(f"🗓️ {job.name} first run at {job.due:%Y-%m-%d %H:%M:%S}")
+
+        while True:
+            self._wake.clear()
+            now = datetime.now()
+            busy = {job.group for job in self.jobs if job.running and job.group}
+            for job in self.jobs:
+                # Single flight: never start a job while its previous run (or
+                # another job of its group) is going; earlier jobs win ties
+                if not job.running and job.due <= now and job.group not in busy:
+                    job.running = True
+                    if job.group:
+                        busy.add(job.group)
+                    task = asyncio.create_task(self._run(job))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+
+            # Jobs blocked by their group are woken when the group's job finishes
+            waiting = [job.due for job in self.jobs if not job.running and job.group not in busy]
+            sleep = (min(waiting) - now).total_seconds() if waiting else MAX_SLEEP_SECONDS
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=min(max(sleep, 0), MAX_SLEEP_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+
+    def run_forever(self):
+        asyncio.run(self.run())